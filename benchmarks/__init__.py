@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+# Benchmarks of msgpack_pure.  Run the suite with python -m benchmarks,
+# see runner.py for the options and the results.
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Compares decoding a record stream with Unpacker and with parallel_unpack()
+# on an increasing number of processes.
+
+import sys, time, multiprocessing
+from os.path import join, dirname
+sys.path.insert(0, join(dirname(sys.argv[0]), '..'))
+
+from msgpack_pure import packs, Unpacker, parallel_unpack
+
+RECORDS = [{"id": i, "name": "user%d" % i, "score": i * 0.5,
+            "tags": ("a", "b", "c"), "attrs": {"x": i, "y": -i}}
+           for i in range(50000)]
+PACKED = "".join(packs(r) for r in RECORDS)
+
+def bench(name, decode):
+    start = time.time()
+    n = 0
+    for obj in decode():
+        n += 1
+    elapsed = time.time() - start
+    assert n == len(RECORDS)
+    print "%-24s %6.2f s  %8.0f records/s" % (name, elapsed, n / elapsed)
+    return elapsed
+
+def sequential():
+    unpacker = Unpacker()
+    unpacker.feed(PACKED)
+    return unpacker
+
+if __name__ == '__main__':
+    print "%d records, %d bytes, %d cores" % (len(RECORDS), len(PACKED),
+                                             multiprocessing.cpu_count())
+    base = bench("Unpacker", sequential)
+    n = 1
+    while n <= multiprocessing.cpu_count():
+        t = bench("parallel_unpack(%d)" % n,
+                  lambda: parallel_unpack(PACKED, processes=n,
+                                          chunk_size=256 * 1024))
+        print "%24s %6.2fx" % ("speedup", base / t)
+        n *= 2
@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Compares packing records with compile_packer() and with packs().
+
+import sys, timeit
+from os.path import join, dirname
+sys.path.insert(0, join(dirname(sys.argv[0]), '..'))
+
+from msgpack_pure import packs, compile_packer
+
+SCHEMA = [("id", int), ("timestamp", int), ("value", float),
+          ("valid", bool), ("name", str), ("tags", None)]
+
+RECORDS = [{"id": i, "timestamp": 1300000000 + i, "value": i * 0.25,
+            "valid": i % 2 == 0, "name": "sensor-%d" % (i % 100),
+            "tags": ("a", "b")}
+           for i in range(10000)]
+
+def bench(name, pack, repeat=5):
+    best = min(timeit.repeat(lambda: [pack(r) for r in RECORDS],
+                             number=1, repeat=repeat))
+    print "%-16s %8.1f us/record" % (name, best / len(RECORDS) * 1e6)
+    return best
+
+if __name__ == '__main__':
+    generic = bench("packs", packs)
+    compiled = bench("compile_packer", compile_packer(SCHEMA))
+    print "speedup: %.1fx" % (generic / compiled)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# Payload shapes the benchmarks are run on.  Every payload is a list of
+# objects packed and unpacked one by one, generated from a fixed seed so
+# that results of different runs are comparable.  scale multiplies the
+# number of objects.
+
+import random
+
+def rpc_messages(rnd, scale):
+    # msgpack-rpc requests: [type, msgid, method, params]
+    methods = ["get", "put", "delete", "list_keys", "ping", "stat"]
+    return [[0, i, rnd.choice(methods),
+             ["key-%d" % rnd.randint(0, 10000), rnd.randint(0, 1 << 20)]]
+            for i in xrange(int(20000 * scale))]
+
+def wide_records(rnd, scale):
+    # Rows of 50 columns of mixed types
+    def row(i):
+        rec = {}
+        for c in xrange(50):
+            kind = c % 5
+            if kind == 0:
+                value = rnd.randint(-1 << 31, 1 << 31)
+            elif kind == 1:
+                value = rnd.random() * 1000
+            elif kind == 2:
+                value = "value-%d" % rnd.randint(0, 1 << 16)
+            elif kind == 3:
+                value = rnd.random() < 0.5
+            else:
+                value = None
+            rec["column_%02d" % c] = value
+        return rec
+    return [row(i) for i in xrange(int(1000 * scale))]
+
+def deep_nesting(rnd, scale):
+    # Alternating arrays and maps 100 levels deep
+    def nested(levels):
+        obj = rnd.randint(0, 100)
+        for i in xrange(levels):
+            if i % 2:
+                obj = {"child": obj, "level": i}
+            else:
+                obj = [i, obj]
+        return obj
+    return [nested(100) for i in xrange(int(500 * scale))]
+
+def raw_blobs(rnd, scale):
+    # 256KB binary blobs
+    blob = "".join([chr(rnd.randint(0, 255)) for i in xrange(4096)]) * 64
+    return [blob[i:] + blob[:i] for i in xrange(int(40 * scale))]
+
+def numeric_arrays(rnd, scale):
+    # Arrays of 10000 floats or ints
+    arrays = []
+    for i in xrange(int(40 * scale)):
+        if i % 2:
+            arrays.append([rnd.random() for j in xrange(10000)])
+        else:
+            arrays.append([rnd.randint(-1 << 40, 1 << 40)
+                           for j in xrange(10000)])
+    return arrays
+
+def string_maps(rnd, scale):
+    # Maps of 200 long string keys to string values
+    keys = ["com.example.service.attribute.%d.name" % i for i in xrange(200)]
+    return [dict([(k, "some string value number %d" % rnd.randint(0, 1 << 30))
+                  for k in keys])
+            for i in xrange(int(200 * scale))]
+
+PAYLOADS = [
+    ("rpc_messages", rpc_messages),
+    ("wide_records", wide_records),
+    ("deep_nesting", deep_nesting),
+    ("raw_blobs", raw_blobs),
+    ("numeric_arrays", numeric_arrays),
+    ("string_maps", string_maps),
+]
+
+def build(name, scale=1.0):
+    # Returns the objects of the named payload
+    return dict(PAYLOADS)[name](random.Random(name), scale)
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+# Runs the corpus through msgpack_pure and, when it is installed, the C
+# msgpack, and writes the results as JSON.
+#
+# For every payload, implementation and operation (pack, unpack, and
+# stream for decoding the concatenated objects with an Unpacker) the
+# results are:
+#
+#   seconds      best time to process the whole payload
+#   mb_per_s     packed megabytes processed per second
+#   objs_per_s   objects processed per second
+#   p50_us       median time per object, in microseconds (not for stream)
+#   p99_us       99th percentile time per object, in microseconds
+#   peak_kb      peak memory used on top of the input, measured in a
+#                fresh process (approximate, as freed memory is reused)
+#
+# Results can be compared with a baseline saved by an earlier run, e.g.
+# of the parent commit, on the same machine.  The comparison is refused
+# if the baseline was run with another Python, scale or repeat.
+
+import json
+import optparse
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from os.path import abspath, dirname, join
+from timeit import default_timer as timer
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import msgpack_pure
+from benchmarks import corpus
+
+BASELINE = join(ROOT, "benchmarks", "baseline.json")
+
+def _stream_pure(data):
+    unpacker = msgpack_pure.Unpacker()
+    unpacker.feed(data)
+    return list(unpacker)
+
+def implementations():
+    # name -> {operation: function}.  pack takes an object, unpack one
+    # packed object and stream the concatenated packed objects.
+    impls = {
+        "pure": {
+            "pack": msgpack_pure.packs,
+            "unpack": msgpack_pure.unpacks,
+            "stream": _stream_pure,
+        },
+    }
+
+    try:
+        import msgpack
+    except ImportError:
+        return impls
+
+    def stream_c(data):
+        unpacker = msgpack.Unpacker()
+        unpacker.feed(data)
+        return list(unpacker)
+
+    impls["c"] = {
+        "pack": msgpack.packb,
+        "unpack": msgpack.unpackb,
+        "stream": stream_c,
+    }
+    return impls
+
+def _inputs(objs, op):
+    packed = [msgpack_pure.packs(o) for o in objs]
+    if op == "pack":
+        return objs, packed
+    if op == "unpack":
+        return packed, packed
+    return ["".join(packed)], packed
+
+def _percentile(times, p):
+    return times[min(len(times) - 1, int(len(times) * p))]
+
+def measure(func, inputs, nbytes, count, repeat):
+    best = None
+    for i in xrange(repeat):
+        start = timer()
+        for x in inputs:
+            func(x)
+        elapsed = timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    result = {
+        "seconds": best,
+        "mb_per_s": nbytes / best / 1e6,
+        "objs_per_s": count / best,
+        "p50_us": None,
+        "p99_us": None,
+    }
+
+    if len(inputs) == count:
+        # Latency of each object, timed on its own
+        times = []
+        for x in inputs:
+            start = timer()
+            func(x)
+            times.append(timer() - start)
+        times.sort()
+        result["p50_us"] = _percentile(times, 0.5) * 1e6
+        result["p99_us"] = _percentile(times, 0.99) * 1e6
+    return result
+
+def _proc_status_kb(field):
+    f = open("/proc/self/status")
+    try:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    finally:
+        f.close()
+
+def _reset_peak_rss():
+    # Returns the RSS the peak RSS is measured from, in KB.  Linux can
+    # reset the peak to the current RSS, elsewhere it is the peak so far.
+    try:
+        f = open("/proc/self/clear_refs", "w")
+        try:
+            f.write("5")
+        finally:
+            f.close()
+        return _proc_status_kb("VmRSS")
+    except (IOError, OSError, TypeError):
+        return _peak_rss()
+
+def _peak_rss():
+    try:
+        return _proc_status_kb("VmHWM")
+    except (IOError, OSError):
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        rss //= 1024
+    return rss
+
+def measure_memory(payload, impl, op, scale, packed):
+    # Runs one operation over the payload in a fresh interpreter and
+    # returns how much its peak RSS grew, in KB.  Packed input is passed
+    # in a file, so that no garbage of building it is left to reuse.
+    f = tempfile.NamedTemporaryFile(prefix="msgpack-bench-")
+    try:
+        for data in packed:
+            f.write(data)
+        f.flush()
+        out = subprocess.check_output(
+            [sys.executable, "-m", "benchmarks", "--memory-case",
+             "%s:%s:%s:%s" % (payload, impl, op, f.name),
+             "--scale", str(scale)],
+            cwd=ROOT)
+    finally:
+        f.close()
+    return int(out.strip())
+
+def _memory_case(case, scale):
+    payload, impl, op, path = case.split(":", 3)
+    if op == "pack":
+        inputs = corpus.build(payload, scale)
+    else:
+        f = open(path, "rb")
+        try:
+            data = f.read()
+        finally:
+            f.close()
+        if op == "stream":
+            inputs = [data]
+        else:
+            inputs = []
+            off = 0
+            while off < len(data):
+                end = msgpack_pure.skip(data, off)
+                inputs.append(data[off:end])
+                off = end
+            del data
+    func = implementations()[impl][op]
+
+    before = _reset_peak_rss()
+    # The outputs are kept, as an application would use them
+    outputs = [func(x) for x in inputs]
+    print max(0, _peak_rss() - before)
+
+def run(payloads, scale, repeat, memory=True, log=sys.stderr):
+    results = {}
+    impls = implementations()
+    for payload in payloads:
+        objs = corpus.build(payload, scale)
+        for op in ("pack", "unpack", "stream"):
+            inputs, packed = _inputs(objs, op)
+            nbytes = sum(map(len, packed))
+            for impl in sorted(impls):
+                key = "%s/%s/%s" % (payload, impl, op)
+                result = measure(impls[impl][op], inputs, nbytes, len(objs),
+                                 repeat)
+                if memory:
+                    result["peak_kb"] = measure_memory(payload, impl, op,
+                                                       scale, packed)
+                results[key] = result
+                log.write("%-36s %9.2f MB/s %11.0f objs/s\n" %
+                          (key, result["mb_per_s"], result["objs_per_s"]))
+    return results
+
+def metadata(scale, repeat):
+    meta = {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "msgpack_pure": ".".join(map(str, msgpack_pure.version)),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scale": scale,
+        "repeat": repeat,
+    }
+    try:
+        import msgpack
+        meta["msgpack"] = ".".join(map(str, msgpack.version))
+    except ImportError:
+        pass
+    return meta
+
+# Metadata which must be the same for results to be compared
+COMPARED_META = ("python", "implementation", "scale", "repeat")
+
+def mismatched_meta(meta, baseline_meta):
+    # Returns the COMPARED_META keys whose values differ, as messages
+    return ["%s: %r, baseline %r" % (key, meta.get(key),
+                                     baseline_meta.get(key))
+            for key in COMPARED_META
+            if meta.get(key) != baseline_meta.get(key)]
+
+def compare(results, baseline, tolerance):
+    # Prints the throughput of results relative to baseline and returns
+    # the keys which are slower by more than tolerance
+    regressions = []
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+        ratio = results[key]["objs_per_s"] / baseline[key]["objs_per_s"]
+        flag = ""
+        if ratio < 1 - tolerance:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        print "%-36s %6.2fx%s" % (key, ratio, flag)
+    return regressions
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage="python -m benchmarks [options]")
+    parser.add_option("-p", "--payload", action="append",
+                      help="payload to run, may be repeated (default: all)")
+    parser.add_option("--scale", type="float", default=1.0,
+                      help="multiplier of the number of objects")
+    parser.add_option("--repeat", type="int", default=3,
+                      help="timed passes over each payload")
+    parser.add_option("--no-memory", action="store_true",
+                      help="do not measure peak memory")
+    parser.add_option("-o", "--output", help="write the results to OUTPUT")
+    parser.add_option("--save-baseline", action="store_true",
+                      help="store the results as the baseline")
+    parser.add_option("--compare", metavar="FILE", nargs=1,
+                      help="compare with FILE, e.g. %s" %
+                      os.path.relpath(BASELINE))
+    parser.add_option("--tolerance", type="float", default=0.1,
+                      help="slowdown reported as a regression")
+    parser.add_option("--memory-case", help=optparse.SUPPRESS_HELP)
+    options, args = parser.parse_args(argv)
+
+    if options.memory_case:
+        _memory_case(options.memory_case, options.scale)
+        return 0
+
+    payloads = options.payload or [name for name, f in corpus.PAYLOADS]
+    results = run(payloads, options.scale, options.repeat,
+                  memory=not options.no_memory)
+    report = {"meta": metadata(options.scale, options.repeat),
+              "results": results}
+
+    for path in [options.output, options.save_baseline and BASELINE]:
+        if path:
+            f = open(path, "w")
+            try:
+                json.dump(report, f, indent=1, sort_keys=True)
+            finally:
+                f.close()
+
+    if options.compare:
+        f = open(options.compare)
+        try:
+            baseline = json.load(f)
+        finally:
+            f.close()
+        mismatched = mismatched_meta(report["meta"], baseline.get("meta", {}))
+        if mismatched:
+            sys.stderr.write("Cannot compare with %s, it was run with other "
+                             "settings:\n" % options.compare)
+            for message in mismatched:
+                sys.stderr.write("  %s\n" % message)
+            return 2
+        if compare(results, baseline["results"], options.tolerance):
+            return 1
+    return 0
@@ -1,5 +1,10 @@
 # -*- coding: utf-8 -*-
 from msgpack_pure._core import *
+from msgpack_pure._reader import RecordReader
+from msgpack_pure._schema import compile_packer, record_class
+from msgpack_pure._lazy import LazyArray, LazyMap
+from msgpack_pure._parallel import parallel_unpack
+from msgpack_pure._stats import Stats
 from msgpack_pure.__version__ import *
 
 # compatible interfaces with simplejson/marshal/pickle.
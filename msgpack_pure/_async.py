@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# Coroutines for asyncio streams.  Python 2 has asyncio as the trollius
+# package, which is an optional dependency of msgpack_pure.
+
+try:
+    import trollius as asyncio
+    from trollius import From, Return
+    coroutine = asyncio.coroutine
+except ImportError:
+    asyncio = None
+    coroutine = lambda func: func
+
+from msgpack_pure._core import Packer, Unpacker, _DEFAULT_READ_SIZE
+
+_DEFAULT_BUFFER_SIZE = 64 * 1024
+
+
+def _check_asyncio():
+    if asyncio is None:
+        raise ImportError("trollius is required for asyncio support.")
+
+
+class AsyncUnpacker(object):
+    # Decodes the objects read from an asyncio StreamReader.
+    #
+    # The reader is read read_size bytes at a time into an Unpacker, so
+    # no more than the objects not decoded yet and one chunk are buffered
+    # per connection.  Use as:
+    #
+    #     while True:
+    #         try:
+    #             obj = yield From(unpacker.unpack())
+    #         except EOFError:
+    #             break
+    def __init__(self, reader, read_size=_DEFAULT_READ_SIZE, **kwargs):
+        _check_asyncio()
+        self.reader = reader
+        self.read_size = read_size
+        self._unpacker = Unpacker(**kwargs)
+
+    @coroutine
+    def unpack(self):
+        # Returns the next object.  Raises EOFError at the end of the
+        # stream, where an incomplete object is ignored like Unpacker does.
+        while True:
+            try:
+                obj = self._unpacker.unpack()
+            except StopIteration:
+                data = yield From(self.reader.read(self.read_size))
+                if not data:
+                    raise EOFError()
+                self._unpacker.feed(data)
+            else:
+                raise Return(obj)
+
+
+class AsyncPacker(object):
+    # Packs objects to an asyncio StreamWriter.
+    #
+    # The packed objects are buffered and written to the writer in one
+    # block once there are buffer_size bytes of them, or on flush(), which
+    # waits for the writer to drain, so that a slow peer slows down the
+    # coroutine writing to it instead of filling up memory.
+    def __init__(self, writer, buffer_size=_DEFAULT_BUFFER_SIZE, **kwargs):
+        _check_asyncio()
+        self.writer = writer
+        self.buffer_size = buffer_size
+        self._packer = Packer(**kwargs)
+        self._pending = []
+        self._pending_size = 0
+
+    @coroutine
+    def pack(self, obj):
+        data = self._packer.pack(obj)
+        self._pending.append(data)
+        self._pending_size += len(data)
+        if self._pending_size >= self.buffer_size:
+            yield From(self.flush())
+
+    @coroutine
+    def flush(self):
+        if self._pending:
+            self.writer.write("".join(self._pending))
+            del self._pending[:]
+            self._pending_size = 0
+        yield From(self.writer.drain())
@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 
+import array
+import functools
 import struct
-from cStringIO import StringIO
+import sys
 
 # Object headers
 _NIL = 0xc0
@@ -48,278 +50,1615 @@ _UINT16_MAX = 0xFFFF
 _UINT32_MAX = 0xFFFFFFFF
 _UINT64_MAX = 0xFFFFFFFFFFFFFFFF
 
-def packs(obj, **kwargs):
-    if kwargs.get('default'):
-        obj = kwargs['default'](obj)
-
-    if obj == None:  return chr(_NIL)
-
-    if isinstance(obj,bool) and obj:
-        return chr(_TRUE)
+_DEFAULT_READ_SIZE = 1024 * 1024
+
+# Headers of the fixed-width scalars array.array items are packed as,
+# keyed by typecode.  Arrays of other typecodes are packed item by item.
+def _build_typed_array_headers():
+    signed   = {1: _INT8,  2: _INT16,  4: _INT32,  8: _INT64}
+    unsigned = {1: _UINT8, 2: _UINT16, 4: _UINT32, 8: _UINT64}
+    floats   = {4: _FLOAT, 8: _DOUBLE}
+
+    headers = {}
+    for codes, table in [("bhil", signed), ("BHIL", unsigned), ("fd", floats)]:
+        for code in codes:
+            headers[code] = table[array.array(code).itemsize]
+    return headers
+
+_TYPED_ARRAY_HEADERS = _build_typed_array_headers()
+
+# Key of the map compact_arrays packs an array.array as
+_COMPACT_ARRAY_KEY = "__array__"
+
+# Longer than any raw, i.e. raws are never returned as memoryviews.
+_NO_RAW_VIEW = _UINT32_MAX + 1
+
+# Precompiled structs for scalars and length fields
+_S_UINT8  = struct.Struct("B")
+_S_UINT16 = struct.Struct(">H")
+_S_UINT32 = struct.Struct(">I")
+_S_UINT64 = struct.Struct(">Q")
+_S_INT8   = struct.Struct("b")
+_S_INT16  = struct.Struct(">h")
+_S_INT32  = struct.Struct(">i")
+_S_INT64  = struct.Struct(">q")
+_S_FLOAT  = struct.Struct(">f")
+_S_DOUBLE = struct.Struct(">d")
+
+# Packed fixnums, indexed by value + 32, and the other objects and headers
+# which are packed into a single byte
+_PACKED_FIXNUMS = tuple([chr(n & 0xff) for n in range(-32, 128)])
+_PACKED_NIL   = chr(_NIL)
+_PACKED_TRUE  = chr(_TRUE)
+_PACKED_FALSE = chr(_FALSE)
+_PACKED_FIX_RAWS = tuple([chr(_FIX_RAW + n) for n in range(32)])
+_PACKED_FIX_ARYS = tuple([chr(_FIX_ARY + n) for n in range(16)])
+_PACKED_FIX_MAPS = tuple([chr(_FIX_MAP + n) for n in range(16)])
+
+# Values are not cached by a Packer with cache_size if they are packed
+# into more bytes than this
+_CACHED_MAX_BYTES = 64
+
+# Chunks of at least this many bytes are copied by Packer.pack_into as
+# they are instead of being joined with the chunks around them
+_JOIN_MAX_BYTES = 4096
+
+# Kinds of object headers.  _HEADER_TABLE maps every header byte to a
+# (kind, arg) pair, where arg is the decoded value for _K_VALUE, the
+# length or size for the _K_FIX_* kinds, and the struct to read the value
+# (or the length/size) with for the other kinds.
+_K_VALUE   = 0
+_K_SCALAR  = 1
+_K_FIX_RAW = 2
+_K_FIX_MAP = 3
+_K_FIX_ARY = 4
+_K_RAW     = 5
+_K_ARY     = 6
+_K_MAP     = 7
+_K_UNKNOWN = 8
+
+def _build_header_table():
+    table = [(_K_UNKNOWN, None)] * 256
+
+    # Positive/Negative Fixnum
+    for b in range(0x00, 0x80):
+        table[b] = (_K_VALUE, b)
+    for b in range(0xe0, 0x100):
+        table[b] = (_K_VALUE, b - 0x100)
+
+    for n in range(32):
+        table[_FIX_RAW + n] = (_K_FIX_RAW, n)
+    for n in range(16):
+        table[_FIX_ARY + n] = (_K_FIX_ARY, n)
+        table[_FIX_MAP + n] = (_K_FIX_MAP, n)
+
+    table[_NIL]   = (_K_VALUE, None)
+    table[_TRUE]  = (_K_VALUE, True)
+    table[_FALSE] = (_K_VALUE, False)
+
+    table[_UINT8]  = (_K_SCALAR, _S_UINT8)
+    table[_UINT16] = (_K_SCALAR, _S_UINT16)
+    table[_UINT32] = (_K_SCALAR, _S_UINT32)
+    table[_UINT64] = (_K_SCALAR, _S_UINT64)
+    table[_INT8]   = (_K_SCALAR, _S_INT8)
+    table[_INT16]  = (_K_SCALAR, _S_INT16)
+    table[_INT32]  = (_K_SCALAR, _S_INT32)
+    table[_INT64]  = (_K_SCALAR, _S_INT64)
+    table[_FLOAT]  = (_K_SCALAR, _S_FLOAT)
+    table[_DOUBLE] = (_K_SCALAR, _S_DOUBLE)
+
+    table[_RAW16] = (_K_RAW, _S_UINT16)
+    table[_RAW32] = (_K_RAW, _S_UINT32)
+    table[_ARY16] = (_K_ARY, _S_UINT16)
+    table[_ARY32] = (_K_ARY, _S_UINT32)
+    table[_MAP16] = (_K_MAP, _S_UINT16)
+    table[_MAP32] = (_K_MAP, _S_UINT32)
+
+    return table
+
+_HEADER_TABLE = _build_header_table()
+
+# Arrays with at least this many items are checked for being homogeneous
+# arrays of fixnums or of one fixed-width scalar type, which are decoded
+# in bulk.
+_BULK_MIN_ITEMS = 16
+
+_FIXNUM_BYTES = "".join(map(chr, range(0x00, 0x80) + range(0xe0, 0x100)))
+
+# Header of a fixed-width scalar -> (struct code, size, array.array
+# typecode or None if no typecode has the size).
+def _build_bulk_headers():
+    typecodes = {}
+    for code, header in _TYPED_ARRAY_HEADERS.items():
+        typecodes.setdefault(header, code)
+
+    bulk = {}
+    for header in _TYPED_ARRAY_HEADERS.values() + [_INT64, _UINT64]:
+        st = _HEADER_TABLE[header][1]
+        bulk[header] = (st.format[-1], st.size, typecodes.get(header))
+    return bulk
+
+_BULK_HEADERS = _build_bulk_headers()
+
+# Kinds of the objects which are neither arrays nor maps
+_SCALAR_KINDS = frozenset([_K_VALUE, _K_SCALAR, _K_FIX_RAW, _K_RAW])
+
+# Containers on the stack of Unpacker.read_obj
+_F_LIST   = 0
+_F_MAP    = 1
+_F_RECORD = 2
+
+def _cached_encoder(encoder, cache, cache_size):
+    # Returns an encoder which packs values with encoder once and then
+    # from their bytes kept in cache
+    def cached_encoder(packer, obj):
+        try:
+            data = cache[obj]
+        except KeyError:
+            buf = packer._buffer
+            start = len(buf)
+            encoder(packer, obj)
+            packer.cache_misses += 1
+            # Values which are false are cheap to pack, and -0.0 would be
+            # found as 0.0
+            if obj and sum(map(len, buf[start:])) <= _CACHED_MAX_BYTES:
+                if len(cache) >= cache_size:
+                    cache.clear()
+                cache[obj] = "".join(buf[start:])
+            return
+        packer._buffer.append(data)
+        packer.cache_hits += 1
+    return cached_encoder
+
+
+class Packer(object):
+    # Packs objects into a single list of chunks which is joined only once
+    # per pack(), so the cost is linear in the size of the output.
+    #
+    # With autoreset (default) pack() returns the packed bytes of each
+    # object.  Otherwise the output of successive pack() calls accumulates
+    # and can be fetched with bytes() and discarded with reset().
+    #
+    # array.array and typed memoryviews (e.g. of ctypes or numpy arrays)
+    # are packed as msgpack arrays in one bulk conversion.  With
+    # compact_arrays they are packed as {"__array__": format, "data": raw}
+    # instead, which compact_array_hook turns back into an array.array.
+    # A memoryview of bytes is packed as a raw.
+    #
+    # With a stream (an object with a write method) the output of pack()
+    # and of the header methods is written to it instead of returned.
+    # Together with pack_array_header(), pack_map_header() and pack_iter()
+    # this packs arrays and maps of any size with constant memory.  With
+    # buffer_size as well, the output is kept until there are buffer_size
+    # bytes of it and then written in one block, and flush() writes what
+    # is left.  As a context manager the Packer is flushed on exit.
+    #
+    # With stats=True, or a Stats shared with other Packers and Unpackers,
+    # the packed objects and the time spent in default (as
+    # "packer_default") are counted in self.stats.
+    #
+    # With cache_size, the bytes of the str, unicode, int, long and float
+    # values packed are kept in a cache of up to cache_size values of each
+    # type, so that values packed again are looked up instead of encoded.
+    # A cache is cleared when it is full.  cache_info() returns its hits.
+    def __init__(self, default=None, autoreset=True, compact_arrays=False,
+                 stream=None, stats=None, cache_size=0, buffer_size=0):
+        if default is not None and not callable(default):
+            raise TypeError("default must be a callable.")
+        if stream is not None and not hasattr(stream, 'write'):
+            raise TypeError("stream must have a write method.")
+        if cache_size < 0:
+            raise ValueError("cache_size must not be negative.")
+        if buffer_size and stream is None:
+            raise TypeError("buffer_size requires a stream.")
+
+        self.default = default
+        self.autoreset = autoreset
+        self.compact_arrays = compact_arrays
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.stats = _make_stats(stats)
+        self._default = default
+        if self.stats is not None:
+            self._default = self.stats.timed(default, 'packer_default')
+        # Items left in the containers whose headers have been output by
+        # pack_array_header() and pack_map_header(), for the stats
+        self._stats_pending = []
+        self._buffer = []
+        # Bytes of output kept for the stream
+        self._buffered = 0
+
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._caches = []
+        if cache_size:
+            self._encoders = dict(self._encoders)
+            for cls in (str, unicode, int, long, float):
+                cache = {}
+                self._caches.append(cache)
+                self._encoders[cls] = _cached_encoder(self._encoders[cls],
+                                                      cache, cache_size)
+
+    def pack(self, obj):
+        start = len(self._buffer)
+        try:
+            self._pack(obj)
+        except:
+            if self.autoreset or self.stream is not None:
+                del self._buffer[start:]
+            raise
+        return self._output(start)
+
+    def pack_array_header(self, n):
+        # Starts an array of n items, which are packed by the next n calls
+        # of pack()
+        start = len(self._buffer)
+        self._pack_array_header(n)
+        return self._output(start)
+
+    def pack_map_header(self, n):
+        # Starts a map of n pairs, whose keys and values are packed in turn
+        # by the next 2*n calls of pack()
+        start = len(self._buffer)
+        self._pack_map_header(n)
+        return self._output(start)
+
+    def pack_iter(self, iterable, count=None):
+        # Packs the items of iterable as an array of count items, by
+        # default len(iterable).  With a stream each item is written as
+        # soon as it is produced, so a generator of any length is packed
+        # with constant memory.  ValueError is raised if the iterable does
+        # not have count items, in which case the output is invalid.
+        if count is None:
+            count = len(iterable)
+        stream = self.stream
+        # The output before start has been returned or written
+        start = len(self._buffer)
+        try:
+            self._pack_array_header(count)
+            n = 0
+            for obj in iterable:
+                if n == count:
+                    raise ValueError("Iterable has more than %d items" %
+                                     count)
+                self._pack(obj)
+                n += 1
+                if stream is not None:
+                    self._output(start)
+                    start = len(self._buffer)
+            if n != count:
+                raise ValueError("Iterable has %d items instead of %d" %
+                                 (n, count))
+        except:
+            if self.autoreset or stream is not None:
+                del self._buffer[start:]
+            raise
+        return self._output(start)
+
+    def pack_many(self, iterable):
+        # Packs the objects of iterable one after another and returns the
+        # packed bytes with the list of the offsets the objects start at.
+        # The output is not written to the stream.
+        buf = self._buffer
+        start = len(buf)
+        offsets = []
+        size = 0
+        try:
+            for obj in iterable:
+                offsets.append(size)
+                end = len(buf)
+                self._pack(obj)
+                size += sum(map(len, buf[end:]))
+        except:
+            del buf[start:]
+            raise
+        data = "".join(buf[start:])
+        del buf[start:]
+
+        if self.stats is not None:
+            self.stats.count_packed(data, 0, len(data))
+        return data, offsets
+
+    def packed_size(self, obj):
+        # Returns the number of bytes obj is packed into.  Only the objects
+        # of types without a size function (and what default returns) are
+        # actually packed to be measured.
+        try:
+            size = self._sizes[type(obj)]
+        except KeyError:
+            return self._size_packed(obj)
+        return size(self, obj)
+
+    def pack_into(self, buffer, offset, obj):
+        # Packs obj into the writable buffer (a bytearray, mmap, writable
+        # memoryview, ...) at offset and returns the offset just past it.
+        # The output is not returned or written to the stream, raws of
+        # _JOIN_MAX_BYTES or more are copied into buffer without being
+        # joined, and buffer is left as it is if obj does not fit.
+        buf = self._buffer
+        start = len(buf)
+        try:
+            self._pack(obj)
+        except:
+            del buf[start:]
+            raise
+        chunks = buf[start:]
+        del buf[start:]
+
+        end = offset + sum(map(len, chunks))
+        if offset < 0 or end > len(buffer):
+            raise ValueError("Buffer too small to pack into")
+        if end - offset < _JOIN_MAX_BYTES:
+            buffer[offset:end] = "".join(chunks)
+        else:
+            _write_chunks(buffer, offset, chunks)
+
+        if self.stats is not None:
+            data = "".join(chunks)
+            self.stats.count_packed(data, 0, len(data))
+        return end
+
+    def _output(self, start=0):
+        # Writes the packed data to the stream, or returns it on autoreset.
+        # The chunks from start on are new and counted in the stats.
+        if self.stats is not None:
+            data = "".join(self._buffer[start:])
+            self.stats.count_packed(data, 0, len(data), self._stats_pending)
+
+        if self.stream is not None:
+            if self.buffer_size:
+                self._buffered += sum(map(len, self._buffer[start:]))
+                if self._buffered < self.buffer_size:
+                    return None
+            if self._buffer:
+                self.stream.write(self.bytes())
+                self.reset()
+            return None
 
-    if isinstance(obj,bool) and obj == False:
-        return chr(_FALSE)
+        if self.autoreset:
+            ret = self.bytes()
+            self.reset()
+            return ret
+
+    def bytes(self):
+        buf = self._buffer
+        if len(buf) == 1:
+            return buf[0]
+        ret = "".join(buf)
+        buf[:] = [ret]
+        return ret
+
+    def reset(self):
+        del self._buffer[:]
+        self._buffered = 0
+
+    def flush(self):
+        # Writes the output kept for the stream, and flushes the stream
+        if self.stream is None:
+            return
+        if self._buffer:
+            self.stream.write(self.bytes())
+            self.reset()
+        if hasattr(self.stream, 'flush'):
+            self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def cache_info(self):
+        # Returns the hits and misses of the cache of packed values, and
+        # the number of values in it
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": lookups and float(self.cache_hits) / lookups,
+            "size": sum(map(len, self._caches)),
+            "cache_size": self.cache_size,
+        }
+
+    def _pack(self, obj):
+        try:
+            encoder = self._encoders[type(obj)]
+        except KeyError:
+            encoder = self._find_encoder(type(obj))
+        encoder(self, obj)
+
+    def _find_encoder(self, cls):
+        # Returns the encoder of the first base type of cls, and adds it to
+        # the encoders of the exact types for cls, which are copied into
+        # the Packer first so that Packer._encoders is left as it is
+        for base, encoder in self._base_encoders:
+            if issubclass(cls, base):
+                if '_encoders' not in self.__dict__:
+                    self._encoders = dict(self._encoders)
+                self._encoders[cls] = encoder
+                return encoder
+
+    # The _pack_* methods taking an object are the encoders of its type
+    def _pack_nil(self, obj):
+        self._buffer.append(_PACKED_NIL)
+
+    def _pack_bool(self, obj):
+        if obj:
+            self._buffer.append(_PACKED_TRUE)
+        else:
+            self._buffer.append(_PACKED_FALSE)
 
-    if isinstance(obj, int) or isinstance(obj, long):
-        # Positive Fixnum
-        if 0 <= obj and obj <= 127:
-            return struct.pack("B", obj)
+    def _pack_int(self, obj):
+        write = self._buffer.append
 
-        # Negative Fixnum
-        elif -32 <= obj and obj <= 0:
-            return struct.pack("b", obj)
+        # Positive/Negative Fixnum
+        if -32 <= obj <= 127:
+            write(_PACKED_FIXNUMS[obj + 32])
 
         # uint 8
         elif 0 <= obj <= _UINT8_MAX:
-            return struct.pack("BB", _UINT8, obj)
+            write(struct.pack("BB", _UINT8, obj))
 
         # int 8
         elif _INT8_MIN <= obj and obj <= _INT8_MAX:
-            return struct.pack(">Bb", _INT8, obj)
+            write(struct.pack(">Bb", _INT8, obj))
 
         # uint 16
         elif 0 <= obj <= _UINT16_MAX:
-            return struct.pack(">BH", _UINT16, obj)
+            write(struct.pack(">BH", _UINT16, obj))
 
         elif _INT16_MIN <= obj and obj <= _INT16_MAX:
-            return struct.pack(">Bh", _INT16, obj)
+            write(struct.pack(">Bh", _INT16, obj))
 
         # int 32
         elif _INT32_MIN <= obj and obj <= _INT32_MAX:
-            return struct.pack(">Bi", _INT32, obj)
+            write(struct.pack(">Bi", _INT32, obj))
 
         # uint 32
         elif 0 <= obj <= _UINT32_MAX:
-            return struct.pack(">BI", _UINT32, obj)
+            write(struct.pack(">BI", _UINT32, obj))
 
         # int 64
         elif _INT64_MIN <= obj and obj <= _INT64_MAX:
-            return struct.pack(">Bq", _INT64, obj)
+            write(struct.pack(">Bq", _INT64, obj))
 
         # uint64
         elif 0 <= obj <= _UINT64_MAX:
-            return struct.pack(">BQ", _UINT64, obj)
+            write(struct.pack(">BQ", _UINT64, obj))
+
+        else:
+            raise RuntimeError("Integer value out of range")
+
+    def _pack_str(self, obj):
+        self._pack_raw_header(len(obj))
+        self._buffer.append(obj)
+
+    def _pack_unicode(self, obj):
+        self._pack_str(obj.encode('utf-8'))
+
+    def _pack_float(self, obj):
+        self._buffer.append(struct.pack(">Bd", _DOUBLE, obj))
 
+    def _pack_list(self, obj):
+        self._pack_array_header(len(obj))
+        for o in obj:
+            self._pack(o)
+
+    def _pack_dict(self, obj):
+        self._pack_map_header(len(obj))
+        for (k,v) in obj.iteritems():
+            self._pack(k)
+            self._pack(v)
+
+    def _pack_default(self, obj):
+        # Encoder of the types which have no other encoder: packs what
+        # default converts the object to
+        if self._default is not None:
+            ret = self._default(obj)
+            try:
+                encoder = self._encoders[type(ret)]
+            except KeyError:
+                encoder = self._find_encoder(type(ret))
+            if encoder is not Packer._pack_default.im_func:
+                encoder(self, ret)
+                return
+        raise TypeError("Cannot pack object of type %s" % type(obj).__name__)
+
+    # The _size_* methods return the size of the objects of the types they
+    # are the sizes of in _sizes
+    def _size_one(self, obj):
+        return 1
+
+    def _size_int(self, obj):
+        if -32 <= obj <= 127:
+            return 1
+        elif _INT8_MIN <= obj <= _UINT8_MAX:
+            return 2
+        elif _INT16_MIN <= obj <= _UINT16_MAX:
+            return 3
+        elif _INT32_MIN <= obj <= _UINT32_MAX:
+            return 5
+        elif _INT64_MIN <= obj <= _UINT64_MAX:
+            return 9
         raise RuntimeError("Integer value out of range")
 
-    # raw bytes
-    if isinstance(obj, str) or isinstance(obj, unicode):
-        if isinstance(obj, unicode):
-            obj = obj.encode('utf-8')
+    def _size_str(self, obj):
         nbytes = len(obj)
         if nbytes <= 31:
-            mark = chr(_FIX_RAW + nbytes)
-            obj = mark + obj
-            return struct.pack("%ds" % len(obj), obj)
+            return 1 + nbytes
+        elif nbytes <= 2**16-1:
+            return 3 + nbytes
+        elif nbytes <= 2**32-1:
+            return 5 + nbytes
+        raise RuntimeError("Raw value too long")
+
+    def _size_unicode(self, obj):
+        return self._size_str(obj.encode('utf-8'))
+
+    def _size_float(self, obj):
+        return 9
+
+    def _size_list(self, obj):
+        size = _container_header_size(len(obj))
+        packed_size = self.packed_size
+        for o in obj:
+            size += packed_size(o)
+        return size
+
+    def _size_dict(self, obj):
+        size = _container_header_size(len(obj))
+        packed_size = self.packed_size
+        for (k,v) in obj.iteritems():
+            size += packed_size(k) + packed_size(v)
+        return size
+
+    def _size_packed(self, obj):
+        start = len(self._buffer)
+        try:
+            self._pack(obj)
+            return sum(map(len, self._buffer[start:]))
+        finally:
+            del self._buffer[start:]
+
+    def _pack_raw_header(self, nbytes):
+        if nbytes <= 31:
+            self._buffer.append(_PACKED_FIX_RAWS[nbytes])
 
         elif nbytes <= 2**16-1:
-            return struct.pack(">BH%ds" % nbytes, _RAW16, nbytes, obj)
+            self._buffer.append(struct.pack(">BH", _RAW16, nbytes))
 
         elif nbytes <= 2**32-1:
-            return struct.pack(">BI%ds" % nbytes, _RAW32, nbytes, obj)
-
-    # float
-    if isinstance(obj, float):
-        return struct.pack(">Bd", _DOUBLE, obj)
+            self._buffer.append(struct.pack(">BI", _RAW32, nbytes))
 
-    # array
-    if isinstance(obj, list) or isinstance(obj, tuple):
-        packed = ""
-        sz = len(obj)
+        else:
+            raise RuntimeError("Raw value too long")
 
+    def _pack_array_header(self, sz):
         if sz <= 15:
-            packed += chr(_FIX_ARY + (sz & 0x0f))
-            for i in range(sz):
-                packed += packs(obj[i], **kwargs)
+            self._buffer.append(_PACKED_FIX_ARYS[sz])
 
         elif sz <= 2**16-1:
-            packed += chr(_ARY16)
-            packed += struct.pack(">H", sz)
-            for i in range(sz):
-                packed += packs(obj[i], **kwargs)
+            self._buffer.append(struct.pack(">BH", _ARY16, sz))
 
         elif sz <= 2**32-1:
-            packed += chr(_ARY32)
-            packed += struct.pack(">I", sz)
-            for i in range(sz):
-                packed += packs(obj[i], **kwargs)
+            self._buffer.append(struct.pack(">BI", _ARY32, sz))
 
-        return packed
+        else:
+            raise RuntimeError("Array too long")
 
-    # map
-    if isinstance(obj, dict):
-        sz = len(obj)
-        packed = ""
+    def _pack_map_header(self, sz):
         if sz <= 15:
-            packed += chr(_FIX_MAP + sz)
+            self._buffer.append(_PACKED_FIX_MAPS[sz])
+
         elif sz <= 2**16-1:
-            packed += struct.pack(">BH", _MAP16, sz)
+            self._buffer.append(struct.pack(">BH", _MAP16, sz))
+
         elif sz <= 2**32-1:
-            packed += struct.pack(">BI", _MAP32, sz)
+            self._buffer.append(struct.pack(">BI", _MAP32, sz))
 
-        for (k,v) in obj.iteritems():
-            packed += packs(k, **kwargs)
-            packed += packs(v, **kwargs)
+        else:
+            raise RuntimeError("Map too long")
+
+    def _pack_typed_array(self, obj):
+        write = self._buffer.append
+
+        if isinstance(obj, memoryview):
+            if obj.format == 'B':
+                data = obj.tobytes()
+                self._pack_raw_header(len(data))
+                write(data)
+                return
+            obj = _array_from_view(obj)
+
+        header = _TYPED_ARRAY_HEADERS.get(obj.typecode)
+        if header is None:
+            # 'c' and 'u' arrays hold strings
+            self._pack_array_header(len(obj))
+            for o in obj:
+                self._pack(o)
+            return
+
+        if self.compact_arrays:
+            order = sys.byteorder == 'little' and '<' or '>'
+            data = obj.tostring()
+            self._pack_map_header(2)
+            self._pack(_COMPACT_ARRAY_KEY)
+            self._pack(order + obj.typecode)
+            self._pack("data")
+            self._pack_raw_header(len(data))
+            write(data)
+            return
+
+        # Convert all the items to big endian at once and interleave them
+        # with their headers: every item takes size + 1 bytes.
+        n = len(obj)
+        size = obj.itemsize
+        if size > 1 and sys.byteorder == 'little':
+            obj = array.array(obj.typecode, obj)
+            obj.byteswap()
+        data = obj.tostring()
+
+        packed = bytearray(n * (size + 1))
+        packed[::size + 1] = chr(header) * n
+        for i in range(size):
+            packed[i + 1::size + 1] = data[i::size]
+
+        self._pack_array_header(n)
+        write(str(packed))
+
+    # Encoders of exact types, to which a Packer adds the types found to
+    # be subclasses of the types in _base_encoders (tried in order) as they
+    # are packed
+    _encoders = {
+        type(None): _pack_nil,
+        bool: _pack_bool,
+        int: _pack_int,
+        long: _pack_int,
+        str: _pack_str,
+        unicode: _pack_unicode,
+        float: _pack_float,
+        list: _pack_list,
+        tuple: _pack_list,
+        dict: _pack_dict,
+        array.array: _pack_typed_array,
+        memoryview: _pack_typed_array,
+    }
+    # Size functions of exact types.  Objects of other types are packed to
+    # be measured.
+    _sizes = {
+        type(None): _size_one,
+        bool: _size_one,
+        int: _size_int,
+        long: _size_int,
+        str: _size_str,
+        unicode: _size_unicode,
+        float: _size_float,
+        list: _size_list,
+        tuple: _size_list,
+        dict: _size_dict,
+    }
+    _base_encoders = [
+        (bool, _pack_bool),
+        ((int, long), _pack_int),
+        (str, _pack_str),
+        (unicode, _pack_unicode),
+        (float, _pack_float),
+        ((list, tuple), _pack_list),
+        (dict, _pack_dict),
+        ((array.array, memoryview), _pack_typed_array),
+        (object, _pack_default),
+    ]
+
+
+def _write_chunks(buffer, offset, chunks):
+    # Copies the chunks into buffer at offset.  Large chunks (raws) are
+    # copied as they are, and the chunks between them are joined first, as
+    # joining a small chunk costs much less than assigning it to a slice.
+    i = 0
+    for j, chunk in enumerate(chunks):
+        if len(chunk) >= _JOIN_MAX_BYTES:
+            if i < j:
+                data = "".join(chunks[i:j])
+                buffer[offset:offset + len(data)] = data
+                offset += len(data)
+            buffer[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+            i = j + 1
+    if i < len(chunks):
+        data = "".join(chunks[i:])
+        buffer[offset:offset + len(data)] = data
+
+
+def _container_header_size(sz):
+    if sz <= 15:
+        return 1
+    elif sz <= 2**16-1:
+        return 3
+    elif sz <= 2**32-1:
+        return 5
+    raise RuntimeError("Container too large")
+
+
+def _array_from_view(view):
+    # Copies a typed memoryview into an array.array
+    fmt = view.format
+    order = '='
+    if fmt[:1] in '<>!=@':
+        order, fmt = fmt[0], fmt[1:]
+    if fmt not in _TYPED_ARRAY_HEADERS or \
+       array.array(fmt).itemsize != view.itemsize:
+        raise TypeError("Unsupported memoryview format: %r" % view.format)
+
+    arr = array.array(fmt)
+    arr.fromstring(view.tobytes())
+    if order in '<>!' and (order == '<') != (sys.byteorder == 'little'):
+        arr.byteswap()
+    return arr
 
-        return packed
 
-    # otherwise: unknown type
-    raise TypeError()
+def packs(obj, **kwargs):
+    return Packer(**kwargs).pack(obj)
 
 
-class Unpacker():
-    def __init__(self, **kwargs):
-        self.default_hook = kwargs.get('default')
-        self.object_hook  = kwargs.get('object_hook')
-        self.list_hook    = kwargs.get('list_hook')
-
-        if self.list_hook and not callable(self.list_hook):
-            raise TypeError("list_hook must be a callable.")
-        
-        if self.object_hook and not callable(self.object_hook):
-            raise TypeError("object_hook must be a callable.")
-        
-        if self.default_hook and not callable(self.default_hook):
-            raise TypeError("default_hook must be a callable.")
-            
+def pack_many(iterable, **kwargs):
+    return Packer(**kwargs).pack_many(iterable)
 
-    def apply_hook(self, obj, **kwargs):
-        if self.list_hook and (isinstance(obj, list) or isinstance(obj, tuple)):
-            obj = self.list_hook(obj)
 
-        elif self.object_hook and isinstance(obj, dict):
-            obj = self.object_hook(obj)
+def packed_size(obj, **kwargs):
+    return Packer(**kwargs).packed_size(obj)
 
-        elif self.default_hook:
-            obj = self.default_hook(obj)
 
-        return obj
+def pack_into(buffer, offset, obj, **kwargs):
+    return Packer(**kwargs).pack_into(buffer, offset, obj)
 
-    def unpacks(self, packed):
-        if packed is None or len(packed) == 0: return None
 
-        sio = StringIO(packed)
-        sio.seek(0)
-        obj = self.read_obj(sio)
+def compact_array_hook(obj):
+    # object_hook turning the maps packed with compact_arrays back into
+    # array.array objects.  Can be chained after another object_hook.
+    if _COMPACT_ARRAY_KEY not in obj:
         return obj
 
-    def read_obj(self, mp):
-        try:
-            b = ord(mp.read(1))
-        except ValueError,e:
-            return None
+    fmt = obj[_COMPACT_ARRAY_KEY]
+    data = obj["data"]
+    if isinstance(data, memoryview):
+        data = data.tobytes()
 
-        # Positive Fixnum
-        if b & (1 << 7) == 0:
-            obj = b
+    arr = array.array(fmt[1])
+    arr.fromstring(data)
+    if (fmt[0] == '<') != (sys.byteorder == 'little'):
+        arr.byteswap()
+    return arr
 
-            # Negative Fixnum
-        elif b & 0xE0 == 0xE0:
-            obj = struct.unpack("b", chr(b))[0]
 
-        elif b == _UINT8:
-            obj = struct.unpack("B", mp.read(1))[0]
+class _OutOfData(Exception):
+    pass
 
-        elif b == _INT8:
-            obj = struct.unpack("b", mp.read(1))[0]
 
-        elif b == _UINT16:
-            obj = struct.unpack(">H", mp.read(2))[0]
+_MISSING = object()
 
-        elif b == _INT16:
-            obj = struct.unpack(">h", mp.read(2))[0]
 
-        elif b == _UINT32:
-            obj = struct.unpack(">I", mp.read(4))[0]
+def _as_buffer(data):
+    # Returns data as an object which can be sliced into str and read with
+    # unpack_from without copying it: str and buffer are used as is and
+    # other objects with the buffer interface (bytearray, mmap, ...) are
+    # wrapped in a buffer.  Python 2 cannot wrap a memoryview in a buffer,
+    # so it is the only input which is copied.
+    if isinstance(data, str) or isinstance(data, buffer):
+        return data
+    if isinstance(data, memoryview):
+        return data.tobytes()
+    return buffer(data)
 
-        elif b == _INT32:
-            obj = struct.unpack(">i", mp.read(4))[0]
 
-        elif b == _UINT64:
-            # I'm not sure that format 'Q' is always available...
-            obj = struct.unpack(">Q", mp.read(8))[0]
+def _skip(buf, off):
+    # Returns the offset just past the object at buf[off] without decoding
+    # it.  Only headers and length fields are read, and nesting is handled
+    # by counting the objects left to skip rather than by recursion.
+    size = len(buf)
+    remaining = 1
+    while remaining:
+        remaining -= 1
+        if off >= size:
+            raise _OutOfData(off + 1)
+        b = ord(buf[off])
+        off += 1
 
-        elif b == _INT64:
-            obj = struct.unpack(">q", mp.read(8))[0]
+        kind, arg = _HEADER_TABLE[b]
 
-        elif b == _FLOAT:
-            obj = struct.unpack(">f", mp.read(4))[0]
+        if kind == _K_VALUE:
+            pass
 
-        elif b == _DOUBLE:
-            obj = struct.unpack(">d", mp.read(8))[0]
+        elif kind == _K_SCALAR:
+            off += arg.size
 
-        elif b == _NIL:   obj = None
-        elif b == _TRUE:  obj = True
-        elif b == _FALSE: obj = False
+        elif kind == _K_FIX_RAW:
+            off += arg
 
-        elif (b & 0xe0) == _FIX_RAW:
-            nbytes = b & 0x1F
-            obj = struct.unpack("%ds" % nbytes, mp.read(nbytes))[0]
+        elif kind == _K_FIX_MAP:
+            remaining += 2 * arg
 
-        elif b == _RAW16:
-            nbytes, = struct.unpack(">H", mp.read(2))
-            obj = struct.unpack("%ds" % nbytes, mp.read(nbytes))[0]
+        elif kind == _K_FIX_ARY:
+            remaining += arg
 
-        elif b == _RAW32:
-            nbytes = struct.unpack(">I", mp.read(4))[0]
-            obj = struct.unpack("%ds" % nbytes, mp.read(nbytes))[0]
+        else:
+            if kind == _K_UNKNOWN:
+                raise RuntimeError("Unknown object header: 0x%x" % b)
+
+            end = off + arg.size
+            if end > size:
+                raise _OutOfData(end)
+            n = arg.unpack_from(buf, off)[0]
+            off = end
+
+            if kind == _K_RAW:
+                off += n
+            elif kind == _K_ARY:
+                remaining += n
+            else:
+                remaining += 2 * n
+
+    if off > size:
+        raise _OutOfData(off)
+    return off
+
+
+class _ObjectScanner(object):
+    # Finds where an object which arrives in chunks ends, like _skip but
+    # reading each chunk once: the headers are walked as the chunks are
+    # scanned, and the containers and payloads which are not complete are
+    # carried over to the next chunk.  done is set once the object is
+    # complete, or at an unknown header, which the decoder then reports.
+    def __init__(self):
+        self.done = False
+        # Bytes known to be missing
+        self.missing = 1
+        # Items left in the containers being scanned
+        self._pending = []
+        # Bytes of a payload which are in the next chunks
+        self._skip = 0
+        # Start of a header which is split between chunks
+        self._head = ""
+
+    def scan(self, buf, off, end):
+        if self.done:
+            return
+        if self._skip:
+            n = min(self._skip, end - off)
+            self._skip -= n
+            off += n
+            if self._skip:
+                self.missing = self._skip
+                return
+            if self._end_object():
+                return
+        if self._head:
+            buf = self._head + str(buf[off:end])
+            off = 0
+            end = len(buf)
+            self._head = ""
+
+        pending = self._pending
+        while off < end:
+            b = ord(buf[off])
+            kind, arg = _HEADER_TABLE[b]
+            off += 1
+
+            if kind == _K_VALUE:
+                size = 0
+            elif kind == _K_SCALAR:
+                size = arg.size
+            elif kind == _K_FIX_RAW:
+                size = arg
+            elif kind == _K_FIX_ARY or kind == _K_FIX_MAP:
+                size = -1
+                n = arg
+            elif kind == _K_UNKNOWN:
+                self.done = True
+                return
+            else:
+                if off + arg.size > end:
+                    self._head = buf[off - 1:end]
+                    self.missing = off + arg.size - end
+                    return
+                n = arg.unpack_from(buf, off)[0]
+                off += arg.size
+                size = -1
+                if kind == _K_RAW:
+                    size = n
+
+            if size < 0:
+                if kind == _K_FIX_MAP or kind == _K_MAP:
+                    n *= 2
+                if n:
+                    pending.append(n)
+                    continue
+            else:
+                off += size
+                if off > end:
+                    self._skip = self.missing = off - end
+                    return
+
+            if self._end_object():
+                return
+        self.missing = 1
+
+    def _end_object(self):
+        # Counts an object which has been scanned to the end, and returns
+        # whether it completes the outermost one
+        pending = self._pending
+        while pending:
+            pending[-1] -= 1
+            if pending[-1]:
+                return False
+            pending.pop()
+        self.done = True
+        return True
+
+
+def _container_header(buf, off):
+    # Returns (is_map, number of items, offset of the first item) for the
+    # array or map at buf[off], or None if it is neither.
+    if off >= len(buf):
+        raise _OutOfData(off + 1)
+    kind, arg = _HEADER_TABLE[ord(buf[off])]
+
+    if kind == _K_FIX_ARY or kind == _K_FIX_MAP:
+        return kind == _K_FIX_MAP, arg, off + 1
+
+    if kind == _K_ARY or kind == _K_MAP:
+        end = off + 1 + arg.size
+        if end > len(buf):
+            raise _OutOfData(end)
+        return kind == _K_MAP, arg.unpack_from(buf, off + 1)[0], end
+
+    return None
+
+
+def _make_stats(stats):
+    # Returns the Stats for a stats option of None, True or a Stats
+    if not stats:
+        return None
+    from msgpack_pure._stats import Stats
+    if stats is True:
+        return Stats()
+    if not isinstance(stats, Stats):
+        raise TypeError("stats must be True or a Stats.")
+    return stats
+
+
+def _at_key(frame, key):
+    # Whether the object read next in frame is a map key, or with no frame,
+    # whether a key is read
+    if frame is None:
+        return key
+    return frame[0] == _F_MAP and frame[3] is _MISSING
+
+def _counted(read, stats):
+    # Returns read, a function like read_obj, counting what it decodes
+    def counted_read(buf, off):
+        obj, end = read(buf, off)
+        stats.count_unpacked(buf, off, end)
+        return obj, end
+    return counted_read
+
+
+class _StreamBuffer(object):
+    # Input buffer of the streaming Unpacker.
+    #
+    # Fed chunks are queued and joined lazily, and the consumed prefix is
+    # dropped whenever new data arrives, so only the bytes of objects which
+    # are not decoded yet are kept in memory.
+    def __init__(self):
+        self.data = ""
+        self.pos = 0
+        self.size = 0
+        self.chunks = []
+        # _ObjectScanner of the object at pos, once it has failed to decode
+        self.scanner = None
+
+    def append(self, data):
+        if self.pos:
+            self.data = self.data[self.pos:]
+            self.size -= self.pos
+            self.pos = 0
+        self.chunks.append(data)
+        self.size += len(data)
+        if self.scanner is not None:
+            self.scanner.scan(data, 0, len(data))
+
+    def contents(self):
+        if self.chunks:
+            if self.data or len(self.chunks) > 1:
+                self.chunks.insert(0, self.data)
+                self.data = "".join(self.chunks)
+            else:
+                self.data = self.chunks[0]
+            self.chunks = []
+        return self.data
 
-        elif (b & 0xF0) == _FIX_ARY:
-            sz = b & 0x0F
-            obj = self.read_list_body(mp, sz)
 
-        elif b == _ARY16:
-            sz = struct.unpack(">H", mp.read(2))[0]
-            obj = self.read_list_body(mp, sz)
+class Unpacker():
+    def __init__(self, file_like=None, read_size=0, **kwargs):
+        self.default_hook = kwargs.get('default')
+        self.object_hook  = kwargs.get('object_hook')
+        self.list_hook    = kwargs.get('list_hook')
 
-        elif b == _ARY32:
-            sz = struct.unpack(">I", mp.read(4))[0]
-            obj = self.read_list_body(mp, sz)
+        # Every decoded object is passed to one hook: arrays to list_hook,
+        # maps to object_hook and other objects (or arrays and maps without
+        # their hook) to default.  The hook of each kind of object is
+        # resolved here, and is None if the objects are returned as is.
+        self._list_hook = self.list_hook or self.default_hook or None
+        self._map_hook = self.object_hook or self.default_hook or None
+        self._value_hook = self.default_hook or None
+
+        # If use_list is true, arrays are decoded into lists instead of
+        # tuples.
+        self.use_list = kwargs.get('use_list', False)
+
+        # Raws of at least raw_view_threshold bytes are returned as
+        # read-only memoryview slices of the input instead of str copies.
+        # Map keys are always str, as views are not hashable.  The views
+        # refer to the memory of the input, so an mmap must stay open while
+        # they are used.
+        self.raw_view_threshold = kwargs.get('raw_view_threshold')
+        if self.raw_view_threshold is None:
+            self._raw_view_min = _NO_RAW_VIEW
+        else:
+            self._raw_view_min = self.raw_view_threshold
+        self._view_source = None
+        self._view = None
+
+        # If use_array is true, homogeneous arrays of fixed-width numbers
+        # are returned as array.array instead of tuple where the array
+        # module has a typecode for them.
+        self.use_array = kwargs.get('use_array', False)
+
+        # With key_cache_size, raw map keys are looked up in a cache of up
+        # to key_cache_size keys, so that the maps decoded by this Unpacker
+        # share one str object per distinct key.  The cache is cleared
+        # when it is full.
+        self.key_cache_size = kwargs.get('key_cache_size', 0)
+        if self.key_cache_size:
+            self._key_cache = {}
+        else:
+            self._key_cache = None
+        # Whether map keys can be cached from short raws as they are, i.e.
+        # no hook would apply to them.
+        self._fast_keys = not self.default_hook
+
+        # With record_type, maps whose keys are exactly the fields of the
+        # record type are decoded into instances of it, which it is called
+        # with the values of the fields in order to create, like a
+        # namedtuple or a class made with record_class().  Maps with other
+        # keys are decoded into dicts as usual.  record_type can also be a
+        # sequence of field names to make a class with record_class().
+        # Record keys are matched as packed bytes and not passed to hooks,
+        # so field names must be raws of up to 31 bytes.
+        self.record_type = kwargs.get('record_type')
+        if self.record_type is None:
+            self._record_size = -1
+        else:
+            if not callable(self.record_type):
+                from msgpack_pure._schema import record_class
+                self.record_type = record_class("Record", self.record_type)
+            fields = getattr(self.record_type, '_fields', None) or \
+                     self.record_type.__slots__
+            self._record_size = len(fields)
+            self._record_packed_keys = map(packs, fields)
+            for f, k in zip(fields, self._record_packed_keys):
+                if not _FIX_RAW <= ord(k[0]) < _FIX_RAW + 32:
+                    raise ValueError("Record field must be a raw of up to "
+                                     "31 bytes: %r" % (f,))
+            self._record_keys = dict([(k, i) for i, k in
+                                      enumerate(self._record_packed_keys)])
+
+        # Arrays and maps nested more than max_depth deep are rejected with
+        # ValueError.  Deep input is decoded by read_obj, which does
+        # not recurse, so max_depth only bounds the memory used for it.
+        self.max_depth = kwargs.get('max_depth')
 
-        elif (b & 0xF0) == _FIX_MAP:
-            sz = b & 0x0F
-            obj = self.read_map_body(mp, sz)
+        if self.list_hook and not callable(self.list_hook):
+            raise TypeError("list_hook must be a callable.")
+        
+        if self.object_hook and not callable(self.object_hook):
+            raise TypeError("object_hook must be a callable.")
+        
+        if self.default_hook and not callable(self.default_hook):
+            raise TypeError("default_hook must be a callable.")
 
-        elif b == _MAP16:
-            sz = struct.unpack(">H", mp.read(2))[0]
-            obj = self.read_map_body(mp, sz)
+        if file_like is not None and not callable(getattr(file_like, 'read', None)):
+            raise TypeError("file_like must have a callable read method.")
+
+        # With stats=True, or a Stats shared with other Unpackers and
+        # Packers, the decoded objects and the time spent in hooks are
+        # counted in self.stats.  Otherwise self.stats is None and nothing
+        # is counted.
+        self.stats = _make_stats(kwargs.get('stats'))
+        if self.stats is not None:
+            timed = self.stats.timed
+            self._list_hook = timed(self._list_hook, self.list_hook and
+                                    'list_hook' or 'default')
+            self._map_hook = timed(self._map_hook, self.object_hook and
+                                   'object_hook' or 'default')
+            self._value_hook = timed(self._value_hook, 'default')
+
+        # With lazy, arrays and maps are decoded into LazyArray and LazyMap
+        # proxies, which only decode the items which are accessed.  The
+        # proxies refer to the input, so an mmap must stay open while they
+        # are used.
+        self.lazy = kwargs.get('lazy', False)
+        if self.lazy:
+            if self.list_hook or self.object_hook:
+                raise TypeError("list_hook and object_hook cannot be used with lazy.")
+            from msgpack_pure._lazy import read_lazy_obj, read_lazy_item
+            # Decodes keys, scalars and materialized containers
+            self._eager = Unpacker(**dict(kwargs, lazy=False,
+                                          stats=self.stats))
+            self._read_obj = functools.partial(read_lazy_obj, self)
+            # Decodes the objects whose end is not needed, without
+            # scanning them for it
+            self._read_lazy = functools.partial(read_lazy_item, self)
+        else:
+            # Decodes the objects returned by unpack(), unpacks(), ...
+            self._read_obj = self.read_obj
+            self._read_lazy = None
+        if self.stats is not None:
+            self._read_obj = _counted(self._read_obj, self.stats)
+            self._read_lazy = None
+
+        self.file_like = file_like
+        self.read_size = read_size or _DEFAULT_READ_SIZE
+        self._stream = _StreamBuffer()
+        # Number of bytes the pending object is known to need.
+        self._need = 0
+
+    def feed(self, next_bytes):
+        if self.file_like is not None:
+            raise RuntimeError("feed() cannot be used with file_like.")
+        self._stream.append(str(_as_buffer(next_bytes)))
+
+    def _fill(self):
+        # Read the next chunk from file_like.  If the pending object has
+        # already failed to decode, at least double what is buffered for
+        # it so that a huge object costs O(log n) retries, not O(n).
+        if self.file_like is None:
+            return False
+        stream = self._stream
+        pending = stream.size - stream.pos
+        data = self.file_like.read(max(self.read_size,
+                                       self._need - pending,
+                                       pending))
+        if not data:
+            return False
+        stream.append(data)
+        return True
+
+    def _read_stream(self, read):
+        # Calls read(buf, offset) on the buffered data, and returns what it
+        # returns once it does not run out of data.  When the object does
+        # not decode for lack of data, the chunks which follow are only
+        # scanned for its end, and it is decoded again once it is complete.
+        stream = self._stream
+        while True:
+            scanner = stream.scanner
+            if scanner is None or scanner.done:
+                start = stream.pos
+                buf = stream.contents()
+                try:
+                    obj, stream.pos = read(buf, start)
+                except _OutOfData, e:
+                    self._need = e.args[0] - start
+                    if scanner is None:
+                        scanner = stream.scanner = _ObjectScanner()
+                        scanner.scan(buf, start, len(buf))
+                else:
+                    stream.scanner = None
+                    self._need = 0
+                    return obj
+            if not scanner.done:
+                self._need = stream.size - stream.pos + scanner.missing
+            if not self._fill():
+                raise StopIteration
+
+    def unpack(self):
+        return self._read_stream(self._read_obj)
+
+    def read_packed(self, size):
+        # Returns the packed bytes of the next complete objects of the
+        # stream without decoding them: as many objects as make up size
+        # bytes, or fewer if the rest of them is not buffered yet.  Objects
+        # are delimited exactly as unpack() would decode them.
+        def read(buf, off):
+            start = off
+            end = off + size
+            while off < end:
+                try:
+                    off = _skip(buf, off)
+                except _OutOfData:
+                    if off == start:
+                        raise
+                    break
+            return buf[start:off], off
+        return self._read_stream(read)
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        return self.unpack()
 
-        elif b == _MAP32:
-            sz = struct.unpack(">I", mp.read(4))[0]
-            obj = self.read_map_body(mp, sz)
 
-        else:
-            raise RuntimeError("Unknown object header: 0x%x" % b)
+    def unpacks(self, packed):
+        if packed is None or len(packed) == 0: return None
 
-        return self.apply_hook(obj)
+        try:
+            return self._read_value(_as_buffer(packed), 0)
+        except _OutOfData:
+            raise ValueError("Unpack failed: incomplete input")
+
+    def unpack_many(self, buffers):
+        # Decodes each of buffers like unpacks() and returns the objects in
+        # a list
+        read = self._read_value
+        objs = []
+        try:
+            for packed in buffers:
+                if packed is None or len(packed) == 0:
+                    objs.append(None)
+                else:
+                    objs.append(read(_as_buffer(packed), 0))
+        except _OutOfData:
+            raise ValueError("Unpack failed: incomplete input")
+        return objs
+
+    def unpack_from(self, packed, offset=0):
+        # Decodes one object starting at packed[offset] and returns it with
+        # the offset just past it.  packed may be a str, bytearray, buffer,
+        # memoryview or mmap.
+        try:
+            return self._read_obj(_as_buffer(packed), offset)
+        except _OutOfData:
+            raise ValueError("Unpack failed: incomplete input")
+
+    def extract(self, packed, path, offset=0):
+        # Decodes only the object at path in the object at packed[offset],
+        # e.g. ("user", "id") or ("items", 3): objects off the path are
+        # skipped by their headers, and of a map only the keys are decoded.
+        buf = _as_buffer(packed)
+        try:
+            off = self.find_path(buf, offset, path)
+            return self._read_value(buf, off)
+        except _OutOfData:
+            raise ValueError("Unpack failed: incomplete input")
+
+    def _read_value(self, buf, off):
+        # Decodes the object at buf[off] where the offset past it is not
+        # needed
+        if self._read_lazy is not None:
+            return self._read_lazy(buf, off)
+        return self._read_obj(buf, off)[0]
+
+    def find_path(self, buf, off, path):
+        # Returns the offset of the object at path in the object at buf[off]
+        for key in path:
+            header = _container_header(buf, off)
+            if header is None:
+                raise TypeError("Cannot look up %r in a scalar" % (key,))
+            is_map, n, off = header
+
+            if is_map:
+                for i in xrange(n):
+                    k, off = self.read_obj(buf, off, True)
+                    if k == key:
+                        break
+                    off = _skip(buf, off)
+                else:
+                    raise KeyError(key)
+
+            else:
+                if not isinstance(key, (int, long)):
+                    raise TypeError("Array index must be an integer: %r" % (key,))
+                if key < 0:
+                    key += n
+                if not 0 <= key < n:
+                    raise IndexError("array index out of range")
+                for i in xrange(key):
+                    off = _skip(buf, off)
+
+        return off
+
+    def _raw_view(self, buf, off, end, key):
+        # Map keys are copied, as views are not hashable
+        if key:
+            return buf[off:end]
+        if buf is not self._view_source:
+            self._view = memoryview(buf)
+            self._view_source = buf
+        return self._view[off:end]
+
+    # The read_* methods decode from buf at offset off and return the
+    # decoded object together with the offset just past it.  They raise
+    # _OutOfData with the offset they would have needed if buf is short.
+    def read_obj(self, buf, off, key=False):
+        # The arrays and maps being decoded are kept on a stack of frames
+        # instead of the call stack, so that nesting costs no recursion and
+        # is limited to max_depth containers.  With key, the object is
+        # decoded as a map key.
+        list_hook = self._list_hook
+        map_hook = self._map_hook
+        value_hook = self._value_hook
+        use_list = self.use_list
+        max_depth = self.max_depth
+        record_size = self._record_size
+        key_cache = self._key_cache
+        fast_keys = key_cache is not None and self._fast_keys
+        bulk = not self.default_hook
+        size = len(buf)
+
+        stack = []
+        frame = None
+        while True:
+            # Record fields and cached keys are matched before decoding
+            if frame is not None:
+                ftype = frame[0]
+                if ftype == _F_RECORD:
+                    end = idx = None
+                    if off < size:
+                        end = off + 1 + ord(buf[off]) - _FIX_RAW
+                        if off < end <= off + 32:
+                            idx = self._record_keys.get(buf[off:end])
+                    if idx is None or frame[1][idx] is not _MISSING:
+                        # Not a record, decode the rest of the map into a
+                        # dict of the fields decoded so far
+                        frame = stack[-1] = [_F_MAP,
+                                             self._record_items(frame[1]),
+                                             frame[2], _MISSING]
+                        ftype = _F_MAP
+                    else:
+                        frame[3] = idx
+                        off = end
+
+                if ftype == _F_MAP and fast_keys and frame[3] is _MISSING \
+                   and off < size:
+                    n = ord(buf[off]) - _FIX_RAW
+                    end = off + 1 + n
+                    if 0 <= n <= 31 and end <= size:
+                        k = buf[off + 1:end]
+                        off = end
+                        try:
+                            frame[3] = key_cache[k]
+                        except KeyError:
+                            if len(key_cache) >= self.key_cache_size:
+                                key_cache.clear()
+                            frame[3] = key_cache[k] = k
+
+            if off >= size:
+                raise _OutOfData(off + 1)
+            b = ord(buf[off])
+            off += 1
+
+            kind, arg = _HEADER_TABLE[b]
+
+            if kind == _K_VALUE:
+                obj = arg
+
+            elif kind == _K_SCALAR:
+                end = off + arg.size
+                if end > size:
+                    raise _OutOfData(end)
+                obj = arg.unpack_from(buf, off)[0]
+                off = end
+
+            elif kind == _K_FIX_RAW:
+                end = off + arg
+                if end > size:
+                    raise _OutOfData(end)
+                if arg >= self._raw_view_min:
+                    obj = self._raw_view(buf, off, end, _at_key(frame, key))
+                else:
+                    obj = buf[off:end]
+                off = end
+
+            else:
+                if kind == _K_FIX_MAP or kind == _K_FIX_ARY:
+                    n = arg
+                else:
+                    if kind == _K_UNKNOWN:
+                        raise RuntimeError("Unknown object header: 0x%x" % b)
+                    end = off + arg.size
+                    if end > size:
+                        raise _OutOfData(end)
+                    n = arg.unpack_from(buf, off)[0]
+                    off = end
+
+                if kind == _K_RAW:
+                    end = off + n
+                    if end > size:
+                        raise _OutOfData(end)
+                    if n >= self._raw_view_min:
+                        obj = self._raw_view(buf, off, end,
+                                             _at_key(frame, key))
+                    else:
+                        obj = buf[off:end]
+                    off = end
+
+                else:
+                    if max_depth is not None and len(stack) >= max_depth:
+                        raise ValueError("Unpack failed: nesting deeper "
+                                         "than max_depth")
+
+                    if kind == _K_FIX_ARY or kind == _K_ARY:
+                        ret = None
+                        if n >= _BULK_MIN_ITEMS and bulk:
+                            ret = self.read_bulk_list_body(buf, off, n)
+                        if ret is not None:
+                            obj, off = ret
+                        elif n:
+                            frame = [_F_LIST, [], n]
+                            stack.append(frame)
+                            continue
+                        else:
+                            obj = [] if use_list else ()
+                            if list_hook is not None:
+                                obj = list_hook(obj)
+
+                    elif n == record_size:
+                        if n:
+                            frame = [_F_RECORD, [_MISSING] * n, n, None]
+                            stack.append(frame)
+                            continue
+                        obj = self.record_type()
+                        if value_hook is not None:
+                            obj = value_hook(obj)
+
+                    elif n:
+                        frame = [_F_MAP, {}, n, _MISSING]
+                        stack.append(frame)
+                        continue
+
+                    else:
+                        obj = {}
+                        if map_hook is not None:
+                            obj = map_hook(obj)
+
+            if value_hook is not None and kind in _SCALAR_KINDS:
+                obj = value_hook(obj)
+
+            # obj is complete: add it to the containers it completes
+            while frame is not None:
+                ftype = frame[0]
+                if ftype == _F_LIST:
+                    items = frame[1]
+                    items.append(obj)
+                    if len(items) < frame[2]:
+                        break
+                    obj = items if use_list else tuple(items)
+                    if list_hook is not None:
+                        obj = list_hook(obj)
+
+                elif ftype == _F_MAP:
+                    k = frame[3]
+                    if k is _MISSING:
+                        if key_cache is not None and type(obj) is str:
+                            try:
+                                obj = key_cache[obj]
+                            except KeyError:
+                                if len(key_cache) >= self.key_cache_size:
+                                    key_cache.clear()
+                                key_cache[obj] = obj
+                        frame[3] = obj
+                        break
+                    frame[1][k] = obj
+                    frame[2] -= 1
+                    if frame[2]:
+                        frame[3] = _MISSING
+                        break
+                    obj = frame[1]
+                    if map_hook is not None:
+                        obj = map_hook(obj)
+
+                else:
+                    values = frame[1]
+                    values[frame[3]] = obj
+                    frame[2] -= 1
+                    if frame[2]:
+                        break
+                    obj = self.record_type(*values)
+                    if value_hook is not None:
+                        obj = value_hook(obj)
+
+                stack.pop()
+                frame = stack[-1] if stack else None
+
+            if frame is None:
+                return obj, off
+
+
+    def read_bulk_list_body(self, buf, off, sz):
+        # Decodes the array in one pass if its items are all fixnums or
+        # all the same fixed-width scalar, otherwise returns None.
+        if off >= len(buf):
+            return None
+        b = ord(buf[off])
+
+        if b in _BULK_HEADERS:
+            code, size, typecode = _BULK_HEADERS[b]
+            step = size + 1
+            end = off + sz * step
+            if end > len(buf) or buf[off:end:step] != chr(b) * sz:
+                return None
+
+            # Collect the values without their headers
+            data = bytearray(sz * size)
+            for i in range(size):
+                data[i::size] = buf[off + 1 + i:end:step]
+
+            if self.use_array and typecode:
+                obj = array.array(typecode, str(data))
+                if size > 1 and sys.byteorder == 'little':
+                    obj.byteswap()
+            else:
+                obj = struct.unpack(">%d%s" % (sz, code), str(data))
+                if self.use_list:
+                    obj = list(obj)
+
+        # Positive/Negative Fixnum
+        elif b < 0x80 or b >= 0xe0:
+            end = off + sz
+            data = buf[off:end]
+            if len(data) != sz or data.translate(None, _FIXNUM_BYTES):
+                return None
+
+            obj = array.array('b', data)
+            if self.use_list:
+                obj = obj.tolist()
+            elif not self.use_array:
+                obj = tuple(obj)
 
+        else:
+            return None
 
-    def read_list_body(self, mp, sz):
-        obj = []
-        for i in range(sz):
-            o = self.read_obj(mp)
-            o = self.apply_hook(o)
-            obj.append(o)
-            
-        obj = tuple(obj)
-        return self.apply_hook(obj)
+        if self._list_hook is not None:
+            obj = self._list_hook(obj)
+        return obj, end
 
-    def read_map_body(self, mp, sz):
+    def _record_items(self, values):
+        # Returns the fields decoded of a map which turns out not to be a
+        # record as a dict, with their keys decoded like other map keys
+        key_cache = self._key_cache
         obj = {}
+        for i, v in enumerate(values):
+            if v is not _MISSING:
+                k = self.read_obj(self._record_packed_keys[i], 0, True)[0]
+                if key_cache is not None and type(k) is str:
+                    try:
+                        k = key_cache[k]
+                    except KeyError:
+                        if len(key_cache) >= self.key_cache_size:
+                            key_cache.clear()
+                        key_cache[k] = k
+                obj[k] = v
+        return obj
 
-        for i in range(sz):
-            k = self.read_obj(mp)
-            v = self.read_obj(mp)
+def unpacks(packed, **kwargs):
+    return Unpacker(**kwargs).unpacks(packed)
 
-            k = self.apply_hook(k)
-            v = self.apply_hook(v)
+def unpack_many(buffers, **kwargs):
+    return Unpacker(**kwargs).unpack_many(buffers)
 
-            obj[k] = v
+def unpack_from(packed, offset=0, **kwargs):
+    return Unpacker(**kwargs).unpack_from(packed, offset)
 
-        return self.apply_hook(obj)
-    
-def unpacks(packed, **kwargs):
-    return Unpacker(**kwargs).unpacks(packed)
+def skip(packed, offset=0):
+    # Returns the offset just past the object at packed[offset]
+    try:
+        return _skip(_as_buffer(packed), offset)
+    except _OutOfData:
+        raise ValueError("Unpack failed: incomplete input")
+
+def extract(packed, path, offset=0, **kwargs):
+    return Unpacker(**kwargs).extract(packed, path, offset)
 
 unpack = unpackb = unpacks
 pack = packb = packs
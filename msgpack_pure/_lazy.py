@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+import collections
+
+from msgpack_pure._core import (_MISSING, _OutOfData, _container_header,
+                                 _skip)
+
+
+def read_lazy_item(unpacker, buf, off):
+    # Decodes the object at buf[off], where containers are proxies.  The
+    # end of a container is not looked for: its items are only scanned
+    # when they are accessed.
+    header = _container_header(buf, off)
+    if header is None:
+        return unpacker._eager.read_obj(buf, off)[0]
+
+    is_map, n, body = header
+    if is_map:
+        return LazyMap(unpacker, buf, off, body, n)
+    return LazyArray(unpacker, buf, off, body, n)
+
+
+def read_lazy_obj(unpacker, buf, off):
+    # Replaces Unpacker.read_obj in lazy mode.  Only the headers of
+    # arrays and maps are scanned to find where they end, and the scan is
+    # kept by the proxy for the items accessed later.
+    if _container_header(buf, off) is None:
+        return unpacker._eager.read_obj(buf, off)
+    obj = read_lazy_item(unpacker, buf, off)
+    return obj, obj._find_end()
+
+
+class LazyArray(collections.Sequence):
+    # Array decoded on access.  The offsets of the items are found as far
+    # as the items accessed, and the decoded items are cached.  Nested
+    # arrays and maps are lazy too.
+    __hash__ = None
+
+    def __init__(self, unpacker, buf, start, off, n):
+        # start is the offset of the header, off that of the first item
+        self._unpacker = unpacker
+        self._buf = buf
+        self._start = start
+        self._len = n
+        # Offsets of the items found so far, followed by the end of the
+        # array once they are all found
+        self._offsets = [off]
+        self._items = None
+
+    def _scan(self, i):
+        # Finds the offsets up to that of item i
+        buf = self._buf
+        offsets = self._offsets
+        while len(offsets) <= i:
+            offsets.append(_skip(buf, offsets[-1]))
+
+    def _find_end(self):
+        # Returns the offset just past the array
+        self._scan(self._len)
+        return self._offsets[-1]
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return tuple([self[j] for j in xrange(*i.indices(self._len))])
+
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError("array index out of range")
+
+        if self._items is None:
+            self._items = [_MISSING] * self._len
+        item = self._items[i]
+        if item is _MISSING:
+            try:
+                self._scan(i)
+                item = read_lazy_item(self._unpacker, self._buf,
+                                      self._offsets[i])
+            except _OutOfData:
+                raise ValueError("Unpack failed: incomplete input")
+            self._items[i] = item
+        return item
+
+    def __eq__(self, other):
+        if isinstance(other, (LazyArray, tuple, list)):
+            return len(self) == len(other) and tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        ret = self.__eq__(other)
+        if ret is NotImplemented:
+            return ret
+        return not ret
+
+    def __repr__(self):
+        return '<LazyArray of %d items>' % self._len
+
+    def materialize(self):
+        # Decodes the whole array as Unpacker would without lazy, with
+        # max_depth counted from the array
+        try:
+            return self._unpacker._eager.read_obj(self._buf, self._start)[0]
+        except _OutOfData:
+            raise ValueError("Unpack failed: incomplete input")
+
+
+class LazyMap(collections.Mapping):
+    # Map decoded on access.  The keys are decoded, and the offsets of
+    # the values found, on the first access, and the decoded values are
+    # cached.  Nested arrays and maps are lazy too.
+    def __init__(self, unpacker, buf, start, off, n):
+        self._unpacker = unpacker
+        self._buf = buf
+        self._start = start
+        self._off = off
+        self._len = n
+        self._offsets = None
+        self._values = {}
+
+    def _find_end(self):
+        # Decodes the keys, finds the offsets of the values and returns the
+        # offset just past the map
+        buf = self._buf
+        off = self._off
+        read_key = self._unpacker._eager.read_obj
+        offsets = {}
+        for i in xrange(self._len):
+            key, off = read_key(buf, off, True)
+            offsets[key] = off
+            off = _skip(buf, off)
+        self._offsets = offsets
+        return off
+
+    def _scan(self):
+        if self._offsets is None:
+            try:
+                self._find_end()
+            except _OutOfData:
+                raise ValueError("Unpack failed: incomplete input")
+        return self._offsets
+
+    def __len__(self):
+        return len(self._scan())
+
+    def __iter__(self):
+        return iter(self._scan())
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+
+        off = self._scan()[key]
+        try:
+            value = read_lazy_item(self._unpacker, self._buf, off)
+        except _OutOfData:
+            raise ValueError("Unpack failed: incomplete input")
+        self._values[key] = value
+        return value
+
+    def __repr__(self):
+        return '<LazyMap of %d items>' % self._len
+
+    def materialize(self):
+        # Decodes the whole map as Unpacker would without lazy, with
+        # max_depth counted from the map
+        try:
+            return self._unpacker._eager.read_obj(self._buf, self._start)[0]
+        except _OutOfData:
+            raise ValueError("Unpack failed: incomplete input")
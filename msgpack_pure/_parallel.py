@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import collections
+
+from msgpack_pure._core import Unpacker
+
+_DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# Options whose results cannot be sent back from the processes: lazy
+# proxies and memoryviews refer to the chunk, record_type classes made by
+# record_class() cannot be pickled, and stats would be counted in the
+# processes.
+_UNSUPPORTED_OPTIONS = ('lazy', 'record_type', 'raw_view_threshold', 'stats')
+
+
+def _unpack_chunk(chunk, kwargs):
+    unpacker = Unpacker(**kwargs)
+    unpacker.feed(chunk)
+    return list(unpacker)
+
+
+def parallel_unpack(source, processes=None, chunk_size=_DEFAULT_CHUNK_SIZE,
+                    max_pending=None, pool=None, **kwargs):
+    # Decodes a stream of concatenated objects in a pool of processes and
+    # yields the objects in order.
+    #
+    # source is a file-like object or a str/buffer.  It is split into
+    # chunks of about chunk_size bytes at object boundaries by
+    # Unpacker.read_packed(), which only reads headers, and the chunks are
+    # decoded by Unpacker(**kwargs) in the processes of pool, or of a new
+    # multiprocessing.Pool(processes).  At most max_pending chunks (by
+    # default twice the number of processes) are read ahead of the
+    # objects being yielded.  Hooks must be picklable, i.e. module-level
+    # functions, and the options in _UNSUPPORTED_OPTIONS are rejected with
+    # TypeError.
+    # Check the options before starting the processes
+    for name in _UNSUPPORTED_OPTIONS:
+        value = kwargs.get(name)
+        if value is not None and value is not False:
+            raise TypeError("%s cannot be used with parallel_unpack()." % name)
+    Unpacker(**kwargs)
+
+    import multiprocessing
+    if hasattr(source, 'read'):
+        splitter = Unpacker(source, read_size=chunk_size)
+    else:
+        splitter = Unpacker()
+        splitter.feed(source)
+
+    own_pool = pool is None
+    if own_pool:
+        pool = multiprocessing.Pool(processes)
+    if max_pending is None:
+        max_pending = 2 * (processes or multiprocessing.cpu_count())
+
+    finished = False
+    try:
+        pending = collections.deque()
+        while True:
+            try:
+                chunk = splitter.read_packed(chunk_size)
+            except StopIteration:
+                break
+            pending.append(pool.apply_async(_unpack_chunk, (chunk, kwargs)))
+            if len(pending) >= max_pending:
+                for obj in pending.popleft().get():
+                    yield obj
+
+        while pending:
+            for obj in pending.popleft().get():
+                yield obj
+        finished = True
+
+    finally:
+        if own_pool:
+            if finished:
+                pool.close()
+            else:
+                pool.terminate()
+            pool.join()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+import array
+import os
+import struct
+import sys
+
+from msgpack_pure._core import Unpacker, _OutOfData, _as_buffer, _skip
+
+# Sidecar index file: header followed by the record offsets as a native
+# array of _OFFSET_TYPECODE.  The header records the layout of the array
+# and how many bytes of the data file were indexed.
+_INDEX_MAGIC = "MPKINDEX"
+_INDEX_HEADER = struct.Struct("<8scBQ")
+_OFFSET_TYPECODE = 'L'
+
+
+class RecordReader(object):
+    # Random access to a file of concatenated msgpack records.
+    #
+    # The file is memory-mapped and an index of record offsets is built
+    # lazily, by skipping over records without decoding them, only as far
+    # as the requested records.  The index can be saved to a sidecar file
+    # with save_index() and is loaded from it when present, so that later
+    # readers of the same (append-only) file do not scan it again.
+    #
+    # Extra keyword arguments are passed to the Unpacker used to decode
+    # the records.  A truncated record at the end of the file, e.g. one
+    # which is still being appended, is ignored.
+    def __init__(self, path, index_path=None, **kwargs):
+        import mmap
+        self.path = path
+        self.index_path = index_path or path + ".idx"
+        self._unpacker = Unpacker(**kwargs)
+
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size:
+            self._mmap = mmap.mmap(self._file.fileno(), size,
+                                   access=mmap.ACCESS_READ)
+            self._buf = _as_buffer(self._mmap)
+        else:
+            self._mmap = None
+            self._buf = ""
+
+        self._offsets = array.array(_OFFSET_TYPECODE)
+        # Offset of the first record which is not indexed yet
+        self._scanned = 0
+        self._complete = False
+        self._load_index()
+
+    def close(self):
+        self._buf = ""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _load_index(self):
+        try:
+            f = open(self.index_path, "rb")
+        except IOError:
+            return
+
+        try:
+            header = f.read(_INDEX_HEADER.size)
+            if len(header) != _INDEX_HEADER.size:
+                return
+            magic, byteorder, itemsize, indexed = _INDEX_HEADER.unpack(header)
+            if (magic != _INDEX_MAGIC or byteorder != sys.byteorder[0] or
+                itemsize != self._offsets.itemsize or indexed > len(self._buf)):
+                return
+
+            offsets = array.array(_OFFSET_TYPECODE)
+            data = f.read()
+            if len(data) % offsets.itemsize:
+                return
+            offsets.fromstring(data)
+        finally:
+            f.close()
+
+        self._offsets = offsets
+        self._scanned = indexed
+
+    def save_index(self, path=None):
+        f = open(path or self.index_path, "wb")
+        try:
+            f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, sys.byteorder[0],
+                                       self._offsets.itemsize, self._scanned))
+            self._offsets.tofile(f)
+        finally:
+            f.close()
+
+    def _index_upto(self, i):
+        # Extends the index until it contains record i.  Returns whether
+        # record i exists.
+        offsets = self._offsets
+        buf = self._buf
+        off = self._scanned
+        try:
+            while len(offsets) <= i and not self._complete:
+                if off >= len(buf):
+                    self._complete = True
+                    break
+                try:
+                    end = _skip(buf, off)
+                except _OutOfData:
+                    self._complete = True
+                    break
+                offsets.append(off)
+                off = end
+        finally:
+            self._scanned = off
+        return i < len(offsets)
+
+    def build_index(self):
+        self._index_upto(sys.maxint)
+
+    def __len__(self):
+        self.build_index()
+        return len(self._offsets)
+
+    def _check_index(self, i):
+        if i < 0:
+            i += len(self)
+        if i < 0 or not self._index_upto(i):
+            raise IndexError("record index out of range")
+        return i
+
+    def offset(self, i):
+        return self._offsets[self._check_index(i)]
+
+    def _decode(self, i):
+        return self._unpacker.unpack_from(self._buf, self._offsets[i])[0]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            if (i.step is None or i.step > 0) and (i.start or 0) >= 0 and \
+               i.stop is not None and i.stop >= 0:
+                # Only index as far as the end of the slice
+                self._index_upto(i.stop - 1)
+                n = len(self._offsets)
+            else:
+                n = len(self)
+            return [self._decode(j) for j in xrange(*i.indices(n))]
+
+        return self._decode(self._check_index(i))
+
+    def iter_range(self, start=0, stop=None):
+        i = start
+        while (stop is None or i < stop) and self._index_upto(i):
+            yield self._decode(i)
+            i += 1
+
+    def __iter__(self):
+        return self.iter_range()
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+import keyword
+import re
+import struct
+
+from msgpack_pure._core import Packer, packs, \
+    _FIX_RAW, _RAW16, _RAW32, _TRUE, _FALSE, _INT64, _DOUBLE
+
+# Fixed-width encodings of the schema types: (struct code, header)
+_FIXED_FIELDS = {
+    int:   ('q', _INT64),
+    long:  ('q', _INT64),
+    float: ('d', _DOUBLE),
+    bool:  ('B', None),
+}
+
+_IDENTIFIER = re.compile(r'^[a-zA-Z_][a-zA-Z0-9_]*$')
+
+# Python types accepted for a field of each schema type
+_FIELD_TYPES = {
+    int:     (int, long),
+    long:    (int, long),
+    float:   (float,),
+    bool:    (bool,),
+    str:     (str,),
+    unicode: (unicode,),
+}
+
+
+def _pack_raw(data):
+    n = len(data)
+    if n <= 31:
+        return chr(_FIX_RAW + n) + data
+    elif n <= 2**16-1:
+        return struct.pack(">BH", _RAW16, n) + data
+    elif n <= 2**32-1:
+        return struct.pack(">BI", _RAW32, n) + data
+    raise RuntimeError("Raw value too long")
+
+
+def _map_header(sz):
+    packer = Packer(autoreset=False)
+    packer._pack_map_header(sz)
+    return packer.bytes()
+
+
+def compile_packer(schema, **kwargs):
+    # Returns a function packing dicts of a fixed shape faster than packs().
+    #
+    # schema is a sequence of (key, type) pairs, where type is one of int,
+    # long, float, bool, str, unicode or None for values of any type.
+    # The function is generated for the schema: the keys are packed in
+    # advance, and the int, float and bool fields are packed together,
+    # right after the map header, with a single struct (ints as int64 and
+    # floats as double).  Dicts which do not match the schema are packed
+    # with packs(obj, **kwargs), as are the values of type None fields.
+    packer = Packer(**kwargs)
+    namespace = {
+        '_fallback': packer.pack,
+        '_pack_any': packer.pack,
+        '_pack_raw': _pack_raw,
+        '_struct_error': struct.error,
+        '_TRUE': _TRUE,
+        '_FALSE': _FALSE,
+    }
+
+    fixed = []
+    variable = []
+    for i, (key, typ) in enumerate(schema):
+        if typ is not None and typ not in _FIELD_TYPES:
+            raise TypeError("Unsupported field type: %r" % (typ,))
+        namespace['_key%d' % i] = key
+        if typ in _FIXED_FIELDS:
+            fixed.append((i, key, typ))
+        else:
+            variable.append((i, key, typ))
+
+    lines = ['def pack_record(obj):',
+             '    try:',
+             '        if len(obj) != %d:' % len(schema),
+             '            return _fallback(obj)']
+    for i in range(len(schema)):
+        lines.append('        v%d = obj[_key%d]' % (i, i))
+    lines += ['    except (KeyError, TypeError):',
+              '        return _fallback(obj)']
+
+    checks = []
+    for i, key, typ in fixed + variable:
+        if typ is not None:
+            namespace['_types%d' % i] = _FIELD_TYPES[typ]
+            checks.append('type(v%d) not in _types%d' % (i, i))
+    if checks:
+        lines += ['    if %s:' % ' or '.join(checks),
+                  '        return _fallback(obj)']
+
+    # The map header, the keys and the headers of the fixed-width fields
+    # are passed to the struct as constant strings.
+    fmt = '>'
+    args = []
+    for i, key, typ in fixed:
+        code, header = _FIXED_FIELDS[typ]
+        const = packs(key)
+        if not args:
+            const = _map_header(len(schema)) + const
+        if header is not None:
+            const += chr(header)
+        namespace['_const%d' % i] = const
+        fmt += '%ds%s' % (len(const), code)
+        args.append('_const%d' % i)
+        if typ is bool:
+            args.append('(v%d and _TRUE or _FALSE)' % i)
+        else:
+            args.append('v%d' % i)
+
+    if fixed:
+        namespace['_fixed'] = struct.Struct(fmt)
+        lines += ['    try:',
+                  '        head = _fixed.pack(%s)' % ', '.join(args),
+                  '    except _struct_error:',
+                  '        return _fallback(obj)']
+    else:
+        namespace['_head'] = _map_header(len(schema))
+        lines.append('    head = _head')
+
+    parts = ['head']
+    for i, key, typ in variable:
+        namespace['_packed_key%d' % i] = packs(key)
+        parts.append('_packed_key%d' % i)
+        if typ is str:
+            parts.append('_pack_raw(v%d)' % i)
+        elif typ is unicode:
+            parts.append("_pack_raw(v%d.encode('utf-8'))" % i)
+        else:
+            parts.append('_pack_any(v%d)' % i)
+    lines.append('    return "".join([%s])' % ', '.join(parts))
+
+    exec '\n'.join(lines) in namespace
+    return namespace['pack_record']
+
+
+
+def record_class(typename, fields):
+    # Returns a class with __slots__ for the given field names, whose
+    # instances are created with the field values in order, like a
+    # namedtuple's.  Such records take much less memory than dicts.
+    fields = tuple(fields)
+    for name in fields:
+        if not isinstance(name, str) or not _IDENTIFIER.match(name) or \
+           keyword.iskeyword(name) or name.startswith('_'):
+            raise ValueError("Invalid field name: %r" % (name,))
+    if len(set(fields)) != len(fields):
+        raise ValueError("Duplicate field names: %r" % (fields,))
+
+    args = ', '.join(fields)
+    lines = ['def __init__(self, %s):' % args]
+    lines += ['    self.%s = %s' % (name, name) for name in fields]
+    lines.append('    pass')
+    namespace = {}
+    exec '\n'.join(lines) in namespace
+
+    return type(typename, (_Record,), {
+        '__slots__': fields,
+        '_fields': fields,
+        '__init__': namespace['__init__'],
+    })
+
+
+class _Record(object):
+    __slots__ = ()
+
+    def _values(self):
+        return tuple([getattr(self, name) for name in self._fields])
+
+    def _asdict(self):
+        return dict(zip(self._fields, self._values()))
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._values() == other._values()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join(
+            ['%s=%r' % (name, getattr(self, name)) for name in self._fields]))
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+from timeit import default_timer as _timer
+
+from msgpack_pure._core import _HEADER_TABLE, \
+    _K_VALUE, _K_SCALAR, _K_FIX_RAW, _K_FIX_MAP, _K_FIX_ARY, _K_RAW, _K_MAP
+
+def _build_tag_names():
+    names = [None] * 256
+    for b in range(0x00, 0x80):
+        names[b] = "positive_fixnum"
+    for b in range(0xe0, 0x100):
+        names[b] = "negative_fixnum"
+    for n in range(32):
+        names[0xa0 + n] = "fixraw"
+    for n in range(16):
+        names[0x90 + n] = "fixarray"
+        names[0x80 + n] = "fixmap"
+    for b, name in [(0xc0, "nil"), (0xc2, "false"), (0xc3, "true"),
+                    (0xca, "float"), (0xcb, "double"),
+                    (0xcc, "uint8"), (0xcd, "uint16"), (0xce, "uint32"),
+                    (0xcf, "uint64"), (0xd0, "int8"), (0xd1, "int16"),
+                    (0xd2, "int32"), (0xd3, "int64"),
+                    (0xda, "raw16"), (0xdb, "raw32"),
+                    (0xdc, "array16"), (0xdd, "array32"),
+                    (0xde, "map16"), (0xdf, "map32")]:
+        names[b] = name
+    return names
+
+_TAG_NAMES = _build_tag_names()
+
+
+class Stats(object):
+    # Counters of the objects packed or unpacked, enabled with stats=True
+    # on a Packer or an Unpacker, or shared between several of them by
+    # passing the same Stats as stats.  Packed and unpacked bytes are
+    # counted apart, and the default of Packers is timed as
+    # "packer_default", apart from the default of Unpackers.
+    #
+    # The objects are counted by their type tags, read from the headers
+    # of the packed data once an object is decoded or packed, so that the
+    # coders themselves are the same with and without stats.  The time
+    # spent in hooks is measured by wrapping them.
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._counts = [0] * 256
+        self.bytes_packed = 0
+        self.bytes_unpacked = 0
+        self.max_depth = 0
+        self.largest_container = 0
+        self._hook_calls = {}
+        self._hook_seconds = {}
+
+    def snapshot(self):
+        # Returns the counters as a dict of plain values
+        objects = {}
+        for b, count in enumerate(self._counts):
+            if count:
+                name = _TAG_NAMES[b]
+                objects[name] = objects.get(name, 0) + count
+        return {
+            "objects": objects,
+            "object_count": sum(self._counts),
+            "bytes_packed": self.bytes_packed,
+            "bytes_unpacked": self.bytes_unpacked,
+            "max_depth": self.max_depth,
+            "largest_container": self.largest_container,
+            "hook_calls": dict(self._hook_calls),
+            "hook_seconds": dict(self._hook_seconds),
+        }
+
+    def timed(self, hook, name):
+        # Returns hook wrapped to add its calls and time to the counters
+        if hook is None:
+            return None
+        def timed_hook(obj):
+            start = _timer()
+            try:
+                return hook(obj)
+            finally:
+                seconds = self._hook_seconds
+                seconds[name] = seconds.get(name, 0.0) + _timer() - start
+                self._hook_calls[name] = self._hook_calls.get(name, 0) + 1
+        return timed_hook
+
+    def count_packed(self, buf, off, end, pending=None):
+        # Counts the objects a Packer output in buf[off:end].  pending is
+        # the list of the items left in each container which is not
+        # complete yet, kept by the Packer between scans of its output as
+        # the header of an array or map can be packed before its items.  It
+        # is not kept in the Stats, which can be shared by several Packers
+        # and Unpackers.
+        self.bytes_packed += end - off
+        self._scan(buf, off, end, pending)
+
+    def count_unpacked(self, buf, off, end):
+        # Counts the objects an Unpacker decoded from buf[off:end]
+        self.bytes_unpacked += end - off
+        self._scan(buf, off, end, None)
+
+    def _scan(self, buf, off, end, pending):
+        counts = self._counts
+        if pending is None:
+            pending = []
+        while off < end:
+            b = ord(buf[off])
+            off += 1
+            counts[b] += 1
+            if pending:
+                pending[-1] -= 1
+
+            kind, arg = _HEADER_TABLE[b]
+            if kind == _K_VALUE:
+                n = -1
+            elif kind == _K_SCALAR:
+                off += arg.size
+                n = -1
+            elif kind == _K_FIX_RAW:
+                off += arg
+                n = -1
+            elif kind == _K_FIX_ARY or kind == _K_FIX_MAP:
+                n = arg
+            else:
+                n = arg.unpack_from(buf, off)[0]
+                off += arg.size
+                if kind == _K_RAW:
+                    off += n
+                    n = -1
+
+            if n >= 0:
+                if n > self.largest_container:
+                    self.largest_container = n
+                if len(pending) + 1 > self.max_depth:
+                    self.max_depth = len(pending) + 1
+                if kind == _K_FIX_MAP or kind == _K_MAP:
+                    n *= 2
+                if n:
+                    pending.append(n)
+
+            while pending and not pending[-1]:
+                pending.pop()
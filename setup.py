@@ -30,7 +30,7 @@ including hosting environments, Windows and Google App Engine.
 setup(
     name='msgpack-pure',
     version=version_str,
-    packages=find_packages( exclude=["tests"] ),
+    packages=find_packages( exclude=["tests", "benchmarks"] ),
     
     author='Keisuke Fukuda',
     author_email='keisukefukuda@gmail.com',
@@ -47,6 +47,10 @@ setup(
     'License :: OSI Approved :: Apache Software License',
     ],
     
+    extras_require={
+        'async': ['trollius'],
+    },
+
     test_suite="nose.collector"
     )
 
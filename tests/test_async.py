@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from nose import main
+from nose.tools import *
+from nose.plugins.skip import SkipTest
+
+try:
+    import trollius as asyncio
+    from trollius import From
+except ImportError:
+    raise SkipTest("trollius is not installed")
+
+from msgpack_pure import packs, Unpacker
+from msgpack_pure._async import AsyncUnpacker, AsyncPacker
+
+objs = [i * "x" for i in range(100)] + [{"foo": (1, 2.5)}]
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+def test_async_unpacker():
+    @asyncio.coroutine
+    def read_all(loop):
+        reader = asyncio.StreamReader(loop=loop)
+        reader.feed_data("".join(packs(o) for o in objs) + "\xa5ab")
+        reader.feed_eof()
+        unpacker = AsyncUnpacker(reader, read_size=7)
+        ret = []
+        while True:
+            try:
+                obj = yield From(unpacker.unpack())
+            except EOFError:
+                break
+            ret.append(obj)
+        raise asyncio.Return(ret)
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert_equal(loop.run_until_complete(read_all(loop)), objs)
+    finally:
+        loop.close()
+
+class Writer(object):
+    def __init__(self):
+        self.writes = []
+        self.drains = 0
+
+    def write(self, data):
+        self.writes.append(data)
+
+    @asyncio.coroutine
+    def drain(self):
+        self.drains += 1
+
+def test_async_packer():
+    writer = Writer()
+    packer = AsyncPacker(writer, buffer_size=100)
+
+    @asyncio.coroutine
+    def write_all():
+        for o in objs:
+            yield From(packer.pack(o))
+        yield From(packer.flush())
+
+    run(write_all())
+    unpacker = Unpacker()
+    unpacker.feed("".join(writer.writes))
+    assert_equal(list(unpacker), objs)
+    assert all(len(w) >= 100 for w in writer.writes[:-1])
+    assert_equal(writer.drains, len(writer.writes))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from nose import main
+from nose.tools import *
+
+from msgpack_pure import packs, unpacks, Unpacker
+
+def nested(levels, leaf=None):
+    obj = leaf
+    for i in range(levels):
+        obj = i % 2 and {"k": obj} or (i, obj)
+    return obj
+
+def test_deep():
+    # Packer recurses, so pack the levels by hand
+    packed = ("\x92\x00\x81\xa1k" * 5000) + packs("leaf")
+    obj = unpacks(packed)
+    for i in range(5000):
+        assert_equal(obj[0], 0)
+        obj = obj[1]["k"]
+    assert_equal(obj, "leaf")
+
+def test_deep_lazy():
+    packed = ("\x92\x00\x81\xa1k" * 5000) + packs("leaf")
+    obj = unpacks(packed, lazy=True).materialize()
+    for i in range(5000):
+        obj = obj[1]["k"]
+    assert_equal(obj, "leaf")
+    assert_raises(ValueError, unpacks(packed, lazy=True, max_depth=100)[1]
+                  .materialize)
+    assert_equal(unpacks(packed, lazy=True, max_depth=100)[0], 0)
+
+def test_max_depth():
+    packed = packs(nested(10))
+    assert_equal(unpacks(packed, max_depth=10), nested(10))
+    assert_raises(ValueError, unpacks, packed, max_depth=9)
+    assert_raises(ValueError, unpacks, packs(((),)), max_depth=1)
+    assert_equal(unpacks(packs(1), max_depth=0), 1)
+
+def test_max_depth_stream():
+    unpacker = Unpacker(max_depth=2)
+    unpacker.feed(packs([[1]]) + packs([[[1]]]))
+    assert_equal(unpacker.unpack(), ((1,),))
+    assert_raises(ValueError, unpacker.unpack)
+
+if __name__ == '__main__':
+    main()
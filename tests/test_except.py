@@ -9,6 +9,10 @@ import datetime
 def test_raise_on_find_unsupported_value():
     assert_raises(TypeError, packs, datetime.datetime.now())
 
+def test_raise_on_unknown_header():
+    for b in ['\xc1', '\xc4', '\xd4', '\xd9']:
+        assert_raises(RuntimeError, unpacks, b)
+
 if __name__ == '__main__':
     from nose import main
     main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from nose import main
+from nose.tools import *
+
+from msgpack_pure import packs, skip, extract, Unpacker
+
+doc = {"user": {"id": 42, "name": "foo", (1, 2): "tuple"},
+       "items": (0, 1.5, "two", {"three": 3}, (4,)) + tuple(range(20)),
+       "blob": "x" * 70000}
+
+def test_skip():
+    for o in [None, 1, -1 << 40, 1.5, "", "x" * 40, "x" * 70000, (),
+              tuple(range(20)), {}, doc, [doc, doc]]:
+        packed = packs(o)
+        assert_equal(skip(packed), len(packed))
+        assert_equal(skip("\xc0" + packed + "\xc0", 1), len(packed) + 1)
+
+def test_skip_incomplete():
+    packed = packs(doc)
+    for n in [1, 10, len(packed) - 1]:
+        assert_raises(ValueError, skip, packed[:n])
+
+def test_extract():
+    packed = packs(doc)
+    assert_equal(extract(packed, ("user", "id")), 42)
+    assert_equal(extract(packed, ("user", (1, 2))), "tuple")
+    assert_equal(extract(packed, ("items", 2)), "two")
+    assert_equal(extract(packed, ("items", 3, "three")), 3)
+    assert_equal(extract(packed, ("items", -1)), 19)
+    assert_equal(extract(packed, ("items", 4)), (4,))
+    assert_equal(extract(packed, ("user",)), doc["user"])
+    assert_equal(extract(packed, ()), doc)
+
+def test_extract_errors():
+    packed = packs(doc)
+    assert_raises(KeyError, extract, packed, ("nothing",))
+    assert_raises(IndexError, extract, packed, ("items", 25))
+    assert_raises(TypeError, extract, packed, ("items", "foo"))
+    assert_raises(TypeError, extract, packed, ("user", "id", 1))
+    assert_raises(ValueError, extract, packed[:20], ("blob",))
+
+def test_extract_unpacker():
+    unpacker = Unpacker(object_hook=lambda o: "hooked")
+    packed = "\xc0" + packs(doc)
+    assert_equal(unpacker.extract(packed, ("items", 2), 1), "two")
+    assert_equal(unpacker.extract(packed, ("items", 3), 1), "hooked")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from nose import main
+from nose.tools import *
+
+from msgpack_pure import packs, unpacks, Unpacker
+
+records = [{"id": i, "name": "user%d" % i, u"score": i * 0.5}
+           for i in range(100)]
+
+def test_shared_keys():
+    decoded = unpacks(packs(records), key_cache_size=16)
+    assert_equal(decoded, tuple(records))
+    for key in ["id", "name", "score"]:
+        keys = set(id(k) for r in decoded for k in r if k == key)
+        assert_equal(len(keys), 1)
+
+def test_shared_keys_across_calls():
+    unpacker = Unpacker(key_cache_size=16)
+    a = unpacker.unpacks(packs({"foo": 1}))
+    b = unpacker.unpacks(packs({"foo": 2}))
+    assert a.keys()[0] is b.keys()[0]
+
+def test_cache_size():
+    unpacker = Unpacker(key_cache_size=2)
+    decoded = unpacker.unpacks(packs(records))
+    assert_equal(decoded, tuple(records))
+    assert len(unpacker._key_cache) <= 2
+
+def test_non_raw_keys():
+    obj = {1: "a", None: "b", (1, 2): "c", "d" * 40: 1}
+    assert_equal(unpacks(packs(obj), key_cache_size=16), obj)
+
+def test_default_hook():
+    decoded = unpacks(packs(records), key_cache_size=16, default=lambda o: o)
+    assert_equal(decoded, tuple(records))
+    assert decoded[0].keys()[0] in decoded[1]
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from nose import main
+from nose.tools import *
+
+from msgpack_pure import packs, unpacks, Unpacker, LazyArray, LazyMap
+from msgpack_pure._core import _MISSING
+
+doc = {"user": {"id": 42, "name": "foo", "groups": ("a", "b")},
+       "items": tuple(range(100)) + ({"x": 1.5},),
+       "blob": "x" * 1000}
+
+def test_lazy():
+    obj = unpacks(packs(doc), lazy=True)
+    assert isinstance(obj, LazyMap)
+    assert isinstance(obj["user"], LazyMap)
+    assert isinstance(obj["items"], LazyArray)
+    assert_equal(obj["user"]["id"], 42)
+    assert_equal(obj["items"][3], 3)
+    assert_equal(obj["items"][-1]["x"], 1.5)
+    assert_equal(obj["items"][2:5], (2, 3, 4))
+    assert_equal(len(obj["items"]), 101)
+    assert_equal(sorted(obj.keys()), ["blob", "items", "user"])
+    assert_equal(obj, doc)
+    assert_raises(KeyError, obj.__getitem__, "nothing")
+    assert_raises(IndexError, obj["items"].__getitem__, 101)
+
+def test_decode_on_access():
+    obj = unpacks(packs(doc), lazy=True)
+    items = obj["items"]
+    assert_equal(obj._values.keys(), ["items"])
+    assert items[5] == 5
+    assert_equal([i for i, v in enumerate(items._items) if v is not _MISSING],
+                 [5])
+    assert items[-1] is items[-1]
+
+def test_materialize():
+    obj = unpacks(packs(doc), lazy=True)
+    assert_equal(type(obj.materialize()), dict)
+    assert_equal(obj.materialize(), doc)
+    assert_equal(type(obj["items"].materialize()), tuple)
+
+def test_scalars():
+    for o in [1, "foo", None, 1.5]:
+        assert_equal(unpacks(packs(o), lazy=True), o)
+
+def test_tuple_keys():
+    obj = unpacks(packs({(1, 2): (3, 4)}), lazy=True)
+    assert_equal(obj[(1, 2)], (3, 4))
+
+def test_stream():
+    packed = packs(doc)
+    unpacker = Unpacker(lazy=True)
+    unpacker.feed(packed[:-1])
+    assert_raises(StopIteration, unpacker.unpack)
+    unpacker.feed(packed[-1:] + packs((1, 2)))
+    assert_equal(unpacker.unpack(), doc)
+    assert_equal(unpacker.unpack(), (1, 2))
+
+def test_scan_on_access():
+    obj = unpacks(packs(tuple(range(100))), lazy=True)
+    assert_equal(obj[3], 3)
+    assert_equal(len(obj._offsets), 4)
+
+    # the stream scans the objects to their end once
+    unpacker = Unpacker(lazy=True)
+    unpacker.feed(packs(range(100)))
+    obj = unpacker.unpack()
+    assert_equal(len(obj._offsets), 101)
+    assert_equal(obj[99], 99)
+
+def test_incomplete():
+    obj = unpacks(packs(doc)[:-10], lazy=True)
+    assert_raises(ValueError, obj.materialize)
+    assert_raises(ValueError, obj.__getitem__, "user")
+    items = unpacks(packs(tuple(range(100)))[:-10], lazy=True)
+    assert_equal(items[3], 3)
+    assert_raises(ValueError, items.__getitem__, 99)
+
+def test_hooks():
+    assert_raises(TypeError, Unpacker, lazy=True, object_hook=dict)
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,7 @@
 from nose import main
 from nose.tools import *
 
-from msgpack_pure import packs, unpacks
+from msgpack_pure import packs, unpacks, Packer, Unpacker, record_class
 #from msgpack import packs, unpacks
 
 def _decode_complex(obj):
@@ -32,6 +32,28 @@ def test_bad_hook():
     packed = packs([3, 1+2j], default=lambda o: o)
     unpacked = unpacks(packed)
 
+def test_default_for_unknown_types():
+    calls = []
+    def default(obj):
+        calls.append(obj)
+        return [obj.real, obj.imag]
+    packed = packs([3, "a", 1+2j, {"k": None}], default=default)
+    eq_(calls, [1+2j])
+    eq_(unpacks(packed), (3, "a", (1, 2), {"k": None}))
+
+class MyInt(int):
+    pass
+
+class MyDict(dict):
+    pass
+
+def test_subclasses():
+    obj = [MyInt(5), MyDict(a=MyInt(300)), True]
+    eq_(packs(obj), packs([5, {"a": 300}, True]))
+    eq_(packs(obj), packs([5, {"a": 300}, True]))
+    # subclasses are only added to the encoders of the Packer
+    assert MyInt not in Packer._encoders
+
 def _arr_to_str(arr):
     return ''.join(str(c) for c in arr)
 
@@ -40,6 +62,44 @@ def test_array_hook():
     unpacked = unpacks(packed, list_hook=_arr_to_str)
     eq_(unpacked, '123')
 
+def test_hooks_called_once():
+    calls = []
+    def hook(tag):
+        def f(obj):
+            calls.append((tag, obj))
+            return obj
+        return f
+    Point = record_class("Point", ["x"])
+    obj = [1, "a", {"b": [2.5]}, {"x": 1}, (), range(20)]
+    packed = packs(obj)
+    unpacks(packed, list_hook=hook("l"), object_hook=hook("o"),
+            default=hook("d"), record_type=Point)
+    assert_equal(calls, [("d", 1), ("d", "a"), ("d", "b"), ("d", 2.5),
+                         ("l", (2.5,)), ("o", {"b": (2.5,)}),
+                         ("d", 1), ("d", Point(1)),
+                         ("l", ())] +
+                        [("d", i) for i in range(20)] +
+                        [("l", tuple(range(20))),
+                         ("l", (1, "a", {"b": (2.5,)}, Point(1), (),
+                                tuple(range(20))))])
+
+    # A map whose first key is a field but not the second one
+    Pair = record_class("Pair", ["a", "b"])
+    packed = "\x82" + packs("a") + packs([1]) + packs("c") + packs(2)
+    del calls[:]
+    unpacks(packed, list_hook=hook("l"), object_hook=hook("o"),
+            default=hook("d"), record_type=Pair)
+    assert_equal(sorted(calls), sorted([("d", 1), ("l", (1,)), ("d", "a"),
+                                        ("d", "c"), ("d", 2),
+                                        ("o", {"a": (1,), "c": 2})]))
+
+def test_use_list():
+    obj = [1, [], [[2]], {"a": [3]}, [1.5] * 20, range(20)]
+    assert_equal(unpacks(packs(obj), use_list=True), obj)
+    unpacker = Unpacker(use_list=True)
+    assert_equal(unpacker.read_obj(packs(obj), 0)[0], obj)
+    assert_equal(unpacks(packs(obj), use_list=True, list_hook=len), 6)
+
 if __name__ == '__main__':
     test_decode_hook()
     test_encode_hook()
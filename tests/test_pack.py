@@ -4,7 +4,10 @@
 from nose import main
 from nose.tools import *
 
-from msgpack import packs, unpacks
+import mmap
+
+from msgpack_pure import packs, unpacks, Packer, packed_size, pack_into, \
+    pack_many, unpack_many
 
 def check(data):
     re = unpacks(packs(data))
@@ -25,5 +28,143 @@ def testPack():
         print td
         check(td)
 
+def testPackerAutoreset():
+    packer = Packer(autoreset=False)
+    packer.pack(1)
+    packer.pack("foo")
+    assert_equal(packer.bytes(), packs(1) + packs("foo"))
+    packer.pack(None)
+    assert_equal(packer.bytes(), packs(1) + packs("foo") + packs(None))
+    packer.reset()
+    assert_equal(packer.bytes(), "")
+    packer.pack(((), {1: 2}))
+    assert_equal(packer.bytes(), packs(((), {1: 2})))
+
+def testPackerResetOnError():
+    packer = Packer()
+    assert_raises(TypeError, packer.pack, (1, object()))
+    assert_equal(packer.pack(1), packs(1))
+
+def testLargeArray():
+    data = tuple(range(100000))
+    assert_equal(unpacks(packs(data)), data)
+
+def testPackHeaders():
+    packer = Packer()
+    packed = packer.pack_array_header(3) + packer.pack(1) + \
+        packer.pack_map_header(1) + packer.pack("a") + packer.pack(2) + \
+        packer.pack(None)
+    assert_equal(packed, packs((1, {"a": 2}, None)))
+    assert_equal(packer.pack_array_header(70000)[:1], "\xdd")
+    assert_equal(packer.pack_map_header(20)[:1], "\xde")
+
+def testPackIter():
+    gen = (i * 2 for i in xrange(1000))
+    assert_equal(Packer().pack_iter(gen, 1000), packs(range(0, 2000, 2)))
+    assert_equal(Packer().pack_iter([1, "a"]), packs((1, "a")))
+
+def testPackIterStream():
+    from StringIO import StringIO
+    f = StringIO()
+    packer = Packer(stream=f)
+    assert_equal(packer.pack_iter(iter(xrange(100)), 100), None)
+    packer.pack_map_header(1)
+    packer.pack("k")
+    packer.pack_iter([], 0)
+    assert_equal(f.getvalue(), packs(range(100)) + packs({"k": ()}))
+
+def testPackMany():
+    objs = [1, "a" * 40, {"k": [None, 1.5]}, ()]
+    data, offsets = pack_many(iter(objs))
+    assert_equal(data, "".join(map(packs, objs)))
+    assert_equal(offsets, [0, 1, 44, 58])
+    assert_equal(pack_many([]), ("", []))
+
+    packer = Packer(autoreset=False)
+    packer.pack(1)
+    assert_raises(TypeError, packer.pack_many, [2, object()])
+    assert_equal(packer.bytes(), packs(1))
+
+def testUnpackMany():
+    objs = [1, "a" * 40, {"k": (None, 1.5)}, ()]
+    buffers = map(packs, objs) + [""]
+    assert_equal(unpack_many(buffers), objs + [None])
+    assert_equal(unpack_many([bytearray(packs([1]))], use_list=True), [[1]])
+    assert_raises(ValueError, unpack_many, [packs(1), packs("abc")[:-1]])
+
+class _Writes(object):
+    def __init__(self):
+        self.writes = []
+        self.flushed = 0
+    def write(self, data):
+        self.writes.append(data)
+    def flush(self):
+        self.flushed += 1
+
+def testPackerBufferSize():
+    f = _Writes()
+    with Packer(stream=f, buffer_size=100) as packer:
+        for i in xrange(30):
+            assert_equal(packer.pack("0123456789"), None)
+        assert_equal(map(len, f.writes), [110, 110, 110])
+        packer.pack_iter(iter("abc"), 3)
+        assert_raises(TypeError, packer.pack, [1, object()])
+    assert_equal(map(len, f.writes), [110, 110, 110, 7])
+    assert_equal(f.flushed, 1)
+    assert_equal("".join(f.writes), packs("0123456789") * 30 +
+                 packs(tuple("abc")))
+    assert_raises(TypeError, Packer, buffer_size=100)
+
+def testPackIterWrongCount():
+    packer = Packer()
+    assert_raises(ValueError, packer.pack_iter, iter([1, 2]), 3)
+    assert_raises(ValueError, packer.pack_iter, iter([1, 2]), 1)
+    assert_equal(packer.pack(1), packs(1))
+
+def testPackerCache():
+    values = [u"caf\xe9", "key", 1.5, -0.0, 0.0, 1 << 40, 1L << 40, "a" * 100]
+    packer = Packer(cache_size=4)
+    for v in values + values:
+        assert_equal(packer.pack(v), packs(v))
+    info = packer.cache_info()
+    assert_equal(info["hits"], 5)
+    assert_equal(info["misses"], 11)
+    assert_equal(info["size"], 5)
+    assert_equal(Packer().cache_info()["hit_rate"], 0)
+    assert_raises(ValueError, Packer, cache_size=-1)
+
+def testPackerCacheSize():
+    packer = Packer(cache_size=2)
+    for i in range(10):
+        packer.pack("key-%d" % i)
+    assert packer.cache_info()["size"] <= 2
+
+def testPackedSize():
+    test_data = [
+        0, 127, 128, -32, -33, 255, -129, 65536, -32769, 1<<32, -(1<<32),
+        1.5, "", "a"*31, "a"*32, "a"*65536, u"caf\xe9", None, True,
+        [], (1,)*16, {}, dict((i, "a"*i) for i in range(16)),
+        ]
+    for td in test_data:
+        assert_equal(packed_size(td), len(packs(td)))
+    assert_equal(packed_size(1+2j, default=lambda c: [c.real, c.imag]), 19)
+
+def testPackInto():
+    obj = [1, "a" * 10000, {"k": "v"}, "a" * 5000]
+    packed = packs(obj)
+    for buf in [bytearray(len(packed) + 5), mmap.mmap(-1, len(packed) + 5),
+                memoryview(bytearray(len(packed) + 5))]:
+        assert_equal(pack_into(buf, 3, obj), 3 + len(packed))
+        assert bytearray(buf[3:3 + len(packed)]) == bytearray(packed)
+
+def testPackIntoTooSmall():
+    packer = Packer(autoreset=False)
+    packer.pack(1)
+    buf = bytearray(3)
+    assert_raises(ValueError, packer.pack_into, buf, 1, "abc")
+    assert_equal(buf, bytearray(3))
+    assert_equal(packer.pack_into(buf, 1, 2), 2)
+    assert_equal(packer.bytes(), packs(1))
+
 if __name__ == '__main__':
     main()
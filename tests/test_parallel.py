@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from nose import main
+from nose.tools import *
+
+import StringIO
+from msgpack_pure import packs, Unpacker, parallel_unpack
+
+objs = [{"id": i, "name": "x" * (i % 50), "values": tuple(range(i % 20))}
+        for i in range(2000)]
+packed = "".join(packs(o) for o in objs)
+
+def _hook(obj):
+    return obj["id"]
+
+def test_read_packed():
+    unpacker = Unpacker()
+    unpacker.feed(packed)
+    chunks = []
+    while True:
+        try:
+            chunks.append(unpacker.read_packed(1000))
+        except StopIteration:
+            break
+    assert_equal("".join(chunks), packed)
+    assert all(len(c) >= 1000 for c in chunks[:-1])
+
+def test_read_packed_file():
+    unpacker = Unpacker(StringIO.StringIO(packed + packs("x" * 5000)[:-1]),
+                       read_size=100)
+    chunks = []
+    while True:
+        try:
+            chunks.append(unpacker.read_packed(3000))
+        except StopIteration:
+            break
+    assert_equal("".join(chunks), packed)
+
+def test_read_packed_large_object():
+    unpacker = Unpacker(StringIO.StringIO(packs("x" * 5000)), read_size=100)
+    assert_equal(unpacker.read_packed(10), packs("x" * 5000))
+
+def test_parallel_unpack():
+    assert_equal(list(parallel_unpack(packed, processes=2, chunk_size=1000)),
+                 objs)
+
+def test_parallel_unpack_file():
+    f = StringIO.StringIO(packed)
+    assert_equal(list(parallel_unpack(f, processes=2, chunk_size=1000,
+                                      max_pending=1)),
+                 objs)
+
+def test_parallel_unpack_hook():
+    assert_equal(list(parallel_unpack(packed, processes=2, chunk_size=1000,
+                                      object_hook=_hook)),
+                 range(2000))
+
+def test_unsupported_options():
+    for kwargs in [dict(lazy=True), dict(record_type=("id", "name")),
+                   dict(raw_view_threshold=0), dict(stats=True)]:
+        assert_raises(TypeError, parallel_unpack(packed, **kwargs).next)
+    assert_equal(len(list(parallel_unpack(packed, lazy=False))), 2000)
+
+def test_early_exit():
+    gen = parallel_unpack(packed, processes=2, chunk_size=1000)
+    assert_equal(gen.next(), objs[0])
+    gen.close()
+
+if __name__ == '__main__':
+    main()
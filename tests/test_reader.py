@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from nose import main
+from nose.tools import *
+
+import os
+import shutil
+import tempfile
+from msgpack_pure import packs, RecordReader
+
+records = [{"id": i, "name": "user%d" % i, "tags": ("a",) * (i % 20)}
+           for i in range(1000)]
+
+def setup_dir():
+    global tmpdir, path
+    tmpdir = tempfile.mkdtemp()
+    path = os.path.join(tmpdir, "records.mpk")
+    f = open(path, "wb")
+    for r in records:
+        f.write(packs(r))
+    f.close()
+
+def teardown_dir():
+    shutil.rmtree(tmpdir)
+
+@with_setup(setup_dir, teardown_dir)
+def test_getitem():
+    with RecordReader(path) as reader:
+        assert_equal(reader[500], records[500])
+        assert_equal(reader[3], records[3])
+        assert_equal(reader[-1], records[-1])
+        assert_equal(len(reader), len(records))
+        assert_raises(IndexError, reader.__getitem__, len(records))
+        assert_raises(IndexError, reader.__getitem__, -len(records) - 1)
+
+@with_setup(setup_dir, teardown_dir)
+def test_lazy_index():
+    with RecordReader(path) as reader:
+        assert_equal(reader[10], records[10])
+        assert_equal(len(reader._offsets), 11)
+        assert_equal(reader[5:20], records[5:20])
+        assert_equal(len(reader._offsets), 20)
+        assert_equal(reader[::-100], records[::-100])
+
+@with_setup(setup_dir, teardown_dir)
+def test_iter_range():
+    with RecordReader(path) as reader:
+        assert_equal(list(reader.iter_range(990)), records[990:])
+        assert_equal(list(reader.iter_range(10, 15)), records[10:15])
+        assert_equal(list(reader), records)
+
+@with_setup(setup_dir, teardown_dir)
+def test_saved_index():
+    with RecordReader(path) as reader:
+        reader[499]
+        reader.save_index()
+
+    # append to the file: the saved index is reused and extended
+    f = open(path, "ab")
+    f.write(packs("appended"))
+    f.close()
+
+    with RecordReader(path) as reader:
+        assert_equal(len(reader._offsets), 500)
+        assert_equal(reader[499], records[499])
+        assert_equal(reader[-1], "appended")
+        assert_equal(len(reader), len(records) + 1)
+
+@with_setup(setup_dir, teardown_dir)
+def test_truncated_record():
+    f = open(path, "ab")
+    f.write(packs("truncated")[:-1])
+    f.close()
+
+    with RecordReader(path) as reader:
+        assert_equal(len(reader), len(records))
+
+def test_empty_file():
+    f = tempfile.NamedTemporaryFile()
+    with RecordReader(f.name) as reader:
+        assert_equal(len(reader), 0)
+        assert_equal(list(reader), [])
+    f.close()
+
+if __name__ == '__main__':
+    main()
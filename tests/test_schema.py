@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from nose import main
+from nose.tools import *
+
+import collections
+from msgpack_pure import packs, unpacks, compile_packer, record_class, Unpacker
+
+schema = [("id", int), ("name", str), ("score", float), ("ok", bool),
+          (u"label", unicode), ("extra", None)]
+
+record = {"id": 1 << 40, "name": "foo", "score": 0.5, "ok": True,
+          u"label": u"b\xe4r", "extra": (1, {"a": None})}
+
+def check(pack, obj):
+    assert_equal(unpacks(pack(obj)), unpacks(packs(obj)))
+
+def test_match():
+    pack = compile_packer(schema)
+    check(pack, record)
+    r = dict(record, ok=False, name="x" * 100, extra=None, id=-3)
+    check(pack, r)
+
+def test_fixed_only():
+    pack = compile_packer([("a", int), ("b", float)])
+    packed = pack({"a": 1, "b": 2.0})
+    assert_equal(len(packed), 1 + 2 * (2 + 9))
+    assert_equal(unpacks(packed), {"a": 1, "b": 2.0})
+
+def test_variable_only():
+    pack = compile_packer([("a", str), ("b", None)])
+    check(pack, {"a": "x", "b": [1]})
+
+def test_empty():
+    pack = compile_packer([])
+    assert_equal(pack({}), packs({}))
+    check(pack, {"a": 1})
+
+def test_fallback():
+    pack = compile_packer(schema)
+    # missing, extra and mistyped fields
+    check(pack, dict((k, v) for k, v in record.items() if k != "id"))
+    check(pack, dict(record, other=1))
+    check(pack, dict(record, id="1"))
+    check(pack, dict(record, id=True))
+    check(pack, dict(record, score=1))
+    check(pack, dict(record, id=1 << 63))
+    check(pack, [1, 2, 3])
+    check(pack, None)
+
+def test_bad_schema():
+    assert_raises(TypeError, compile_packer, [("a", list)])
+
+def test_default():
+    pack = compile_packer([("a", None)], default=lambda o: o)
+    assert_raises(TypeError, pack, {"a": object()})
+
+Point = record_class("Point", ["x", "y"])
+
+def test_record_class():
+    p = Point(1, 2)
+    assert_equal((p.x, p.y), (1, 2))
+    assert_equal(p, Point(1, 2))
+    assert_not_equal(p, Point(1, 3))
+    assert_equal(p._asdict(), {"x": 1, "y": 2})
+    assert_equal(repr(p), "Point(x=1, y=2)")
+    assert not hasattr(p, "__dict__")
+    assert_raises(ValueError, record_class, "Bad", ["x-y"])
+    assert_raises(ValueError, record_class, "Bad", ["x", "x"])
+
+def test_unpack_records():
+    packed = packs([{"x": 1, "y": 2}, {"y": {"x": 3, "y": 4}, "x": "a"}])
+    assert_equal(unpacks(packed, record_type=Point),
+                 (Point(1, 2), Point("a", Point(3, 4))))
+
+def test_unpack_field_list():
+    obj = unpacks(packs({"x": 1, "y": 2}), record_type=("x", "y"))
+    assert_equal(obj._asdict(), {"x": 1, "y": 2})
+
+def test_unpack_namedtuple():
+    NT = collections.namedtuple("NT", "x y")
+    assert_equal(unpacks(packs({"y": 2, "x": 1}), record_type=NT), NT(1, 2))
+
+def test_unpack_records_fallback():
+    for obj in [{"x": 1}, {"x": 1, "z": 2}, {"x": 1, "y": 2, "z": 3},
+                {1: 1, 2: 2}, {"x" * 40: 1, "y": 2}]:
+        assert_equal(unpacks(packs(obj), record_type=Point), obj)
+
+def test_unpack_long_field():
+    Long = record_class("Long", ["x" * 32])
+    assert_raises(ValueError, Unpacker, record_type=Long)
+    assert_raises(ValueError, Unpacker, record_type=(1, "y"))
+    Short = record_class("Short", ["x" * 31])
+    assert_equal(unpacks(packs({"x" * 31: 1}), record_type=Short), Short(1))
+
+def test_unpack_records_stream():
+    packed = packs({"x": 1, "y": 2})
+    unpacker = Unpacker(record_type=Point)
+    unpacker.feed(packed[:4])
+    assert_raises(StopIteration, unpacker.unpack)
+    unpacker.feed(packed[4:])
+    assert_equal(unpacker.unpack(), Point(1, 2))
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,7 @@ from nose import main
 from nose.tools import *
 
 import StringIO
-import msgpack
+import msgpack_pure as msgpack
 
 binarydata = [chr(i) for i in xrange(256)]
 binarydata = "".join(binarydata)
@@ -2,7 +2,9 @@
 # coding: utf-8
 
 from nose.tools import *
-from msgpack import Unpacker
+from msgpack_pure import Unpacker, packs
+
+import StringIO
 
 def test_foobar():
     unpacker = Unpacker(read_size=3)
@@ -30,6 +32,56 @@ def test_foobar():
         k += 1
     assert k == len('foobar')
 
+def test_partial_object():
+    packed = packs(("foo", {"bar": 1 << 40}, 1.5))
+    unpacker = Unpacker()
+    for c in packed[:-1]:
+        unpacker.feed(c)
+        assert_raises(StopIteration, unpacker.unpack)
+    unpacker.feed(packed[-1])
+    assert_equal(unpacker.unpack(), ("foo", {"bar": 1 << 40}, 1.5))
+    assert_raises(StopIteration, unpacker.unpack)
+
+def test_partial_object_decoded_once():
+    objs = [range(5000), {"k": ["x" * 70000, -1.5]}, 1]
+    packed = "".join(packs(o) for o in objs)
+    unpacker = Unpacker()
+    read = unpacker._read_obj
+    reads = []
+    def counted_read(buf, off):
+        reads.append(off)
+        return read(buf, off)
+    unpacker._read_obj = counted_read
+
+    decoded = []
+    for i in range(0, len(packed), 1000):
+        unpacker.feed(packed[i:i + 1000])
+        decoded.extend(unpacker)
+    assert_equal(decoded, [tuple(range(5000)), {"k": ("x" * 70000, -1.5)}, 1])
+    # The two large objects fail once while they are incomplete and are
+    # decoded once, the last one arrives whole, and the last read is at
+    # the end of the input
+    assert_equal(len(reads), 6)
+
+def test_split_headers():
+    packed = packs([1 << 40, "x" * 300, {"k": range(20)}, -1.5])
+    unpacker = Unpacker()
+    for c in packed[:-1]:
+        unpacker.feed(c)
+        assert_raises(StopIteration, unpacker.unpack)
+    unpacker.feed(packed[-1])
+    assert_equal(unpacker.unpack(),
+                 (1 << 40, "x" * 300, {"k": tuple(range(20))}, -1.5))
+
+def test_file_like():
+    objs = [i * "x" for i in range(100)] + [tuple(range(1000))]
+    f = StringIO.StringIO("".join(packs(o) for o in objs))
+    assert_equal(list(Unpacker(f, read_size=7)), objs)
+
+def test_feed_with_file_like():
+    unpacker = Unpacker(StringIO.StringIO(""))
+    assert_raises(RuntimeError, unpacker.feed, "foo")
+
 if __name__ == '__main__':
     test_foobar()
 
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from nose import main
+from nose.tools import *
+
+from StringIO import StringIO
+from msgpack_pure import packs, unpacks, Packer, Unpacker, Stats
+
+obj = {"a": [1, -1, 300, 1.5, None, True], "b": "x" * 40, "c": {}}
+
+def check_counts(stats, bytes_key):
+    snapshot = stats.snapshot()
+    assert_equal(snapshot["objects"],
+                 {"fixmap": 2, "fixraw": 3, "raw16": 1, "fixarray": 1,
+                  "positive_fixnum": 1, "negative_fixnum": 1, "uint16": 1,
+                  "double": 1, "nil": 1, "true": 1})
+    assert_equal(snapshot["object_count"], 13)
+    assert_equal(snapshot[bytes_key], len(packs(obj)))
+    assert_equal(snapshot["max_depth"], 2)
+    assert_equal(snapshot["largest_container"], 6)
+
+def test_unpacker_stats():
+    unpacker = Unpacker(stats=True)
+    unpacker.feed(packs(obj))
+    assert_equal(unpacker.unpack(), unpacks(packs(obj)))
+    check_counts(unpacker.stats, "bytes_unpacked")
+    assert_equal(unpacker.stats.snapshot()["bytes_packed"], 0)
+    assert_equal(unpacker.stats.snapshot()["hook_calls"], {})
+
+def test_packer_stats():
+    packer = Packer(stats=True)
+    packer.pack(obj)
+    check_counts(packer.stats, "bytes_packed")
+
+def test_packer_stats_stream():
+    packer = Packer(stream=StringIO(), stats=True)
+    packer.pack_map_header(3)
+    for k in ("a", "b", "c"):
+        packer.pack(k)
+        if k == "a":
+            packer.pack_iter(iter(obj[k]), len(obj[k]))
+        else:
+            packer.pack(obj[k])
+    check_counts(packer.stats, "bytes_packed")
+
+def test_disabled():
+    assert_equal(Unpacker().stats, None)
+    assert_equal(Packer().stats, None)
+
+def test_reset():
+    unpacker = Unpacker(stats=True)
+    unpacker.unpacks(packs(obj))
+    unpacker.stats.reset()
+    unpacker.unpacks(packs([]))
+    snapshot = unpacker.stats.snapshot()
+    assert_equal(snapshot["objects"], {"fixarray": 1})
+    assert_equal(snapshot["bytes_unpacked"], 1)
+    assert_equal(snapshot["max_depth"], 1)
+
+def test_shared():
+    stats = Stats()
+    packed = Packer(stats=stats).pack(obj)
+    Unpacker(stats=stats).unpacks(packed)
+    assert_equal(stats.snapshot()["bytes_packed"], len(packed))
+    assert_equal(stats.snapshot()["bytes_unpacked"], len(packed))
+    assert_equal(stats.snapshot()["object_count"], 26)
+    assert_raises(TypeError, Unpacker, stats=object())
+
+def test_shared_open_container():
+    stats = Stats()
+    packer = Packer(stats=stats)
+    packer.pack_array_header(3)
+    unpacks(packs([[1, [2]]]), stats=stats)
+    assert_equal(stats.snapshot()["max_depth"], 3)
+    packer.pack([[1]])
+    assert_equal(stats.snapshot()["max_depth"], 3)
+    assert_equal(stats.snapshot()["object_count"], 9)
+
+def test_hooks():
+    stats = Stats()
+    packed = Packer(default=lambda o: o, stats=stats).pack(obj)
+    unpacks(packed, object_hook=dict, list_hook=list, default=lambda o: o,
+            stats=stats)
+    snapshot = stats.snapshot()
+    # The default of the packer is not called for the types it can pack
+    assert_equal(snapshot["hook_calls"],
+                 {"default": 10, "object_hook": 2, "list_hook": 1})
+    assert_equal(sorted(snapshot["hook_seconds"]),
+                 ["default", "list_hook", "object_hook"])
+
+    Packer(default=lambda o: 1, stats=stats).pack(object())
+    assert_equal(stats.snapshot()["hook_calls"]["packer_default"], 1)
+    assert_equal(stats.snapshot()["hook_calls"]["default"], 10)
+
+def test_lazy():
+    unpacker = Unpacker(stats=True, lazy=True, default=lambda o: o)
+    msg = unpacker.unpacks(packs(obj))
+    assert_equal(msg["a"][2], 300)
+    snapshot = unpacker.stats.snapshot()
+    assert_equal(snapshot["bytes_unpacked"], len(packs(obj)))
+    assert snapshot["hook_calls"]["default"] > 0
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from nose import main
+from nose.tools import *
+
+import array
+import ctypes
+from msgpack_pure import packs, unpacks, compact_array_hook, Unpacker
+
+def check(arr):
+    packed = packs(arr)
+    assert_equal(unpacks(packed), tuple(arr))
+    assert_equal(len(packed), 3 + len(arr) * (arr.itemsize + 1))
+
+def test_array():
+    check(array.array('b', [0, 1, -1, 127, -128] * 10))
+    check(array.array('B', [0, 1, 255] * 10))
+    check(array.array('h', [0, -1, 1 << 14, -(1 << 15)] * 10))
+    check(array.array('H', [0, 1, (1 << 16) - 1] * 10))
+    check(array.array('i', [0, -1, (1 << 31) - 1, -(1 << 31)] * 10))
+    check(array.array('l', [0, -1, 1 << 40, -(1 << 40)] * 10))
+    check(array.array('L', [0, 1, 1 << 40] * 10))
+    check(array.array('f', [0.0, 1.5, -0.25] * 10))
+    check(array.array('d', [0.0, 0.1, -1e300] * 10))
+
+def test_small_array():
+    assert_equal(packs(array.array('d', [1.0])), packs((1.0,)))
+    assert_equal(packs(array.array('d')), packs(()))
+
+def test_char_array():
+    assert_equal(unpacks(packs(array.array('c', "abc"))), ("a", "b", "c"))
+
+def test_memoryview():
+    view = memoryview((ctypes.c_double * 3)(1.0, 2.0, 3.0))
+    assert_equal(unpacks(packs(view)), (1.0, 2.0, 3.0))
+    view = memoryview((ctypes.c_int16 * 3)(1, -2, 3))
+    assert_equal(unpacks(packs(view)), (1, -2, 3))
+
+def test_memoryview_raw():
+    assert_equal(packs(memoryview("foo")), packs("foo"))
+
+def test_compact():
+    for arr in [array.array('d', [0.5, 1.5, -2.0]), array.array('B', [1, 2]),
+                array.array('l', [1 << 40, -1])]:
+        packed = packs({"v": arr}, compact_arrays=True)
+        obj = unpacks(packed, object_hook=compact_array_hook)
+        assert_equal(obj, {"v": arr})
+        assert_equal(type(obj["v"]), array.array)
+
+        obj = unpacks(packed, object_hook=compact_array_hook,
+                      raw_view_threshold=10)
+        assert_equal(obj, {"v": arr})
+
+def check_decode(obj, typecode=None):
+    packed = packs(obj)
+    # the default hook disables bulk decoding
+    assert_equal(unpacks(packed), unpacks(packed, default=lambda o: o))
+    assert_equal(unpacks(packed), tuple(obj))
+    if typecode:
+        arr = unpacks(packed, use_array=True)
+        assert_equal(type(arr), array.array)
+        assert_equal(arr.typecode, typecode)
+        assert_equal(arr.tolist(), list(obj))
+
+def test_bulk_decode():
+    check_decode(range(-32, 128), 'b')
+    check_decode(array.array('b', [-128, 1] * 10), 'b')
+    check_decode(array.array('B', [0, 255] * 10), 'B')
+    check_decode(array.array('h', [-1, 1 << 14] * 10), 'h')
+    check_decode(array.array('H', [1, 65535] * 10), 'H')
+    check_decode(array.array('i', [-1, 1 << 30] * 10), 'i')
+    check_decode(array.array('I', [1, 1 << 31] * 10), 'I')
+    check_decode(array.array('l', [-1, 1 << 60] * 10))
+    check_decode(array.array('L', [1, 1 << 63] * 10))
+    check_decode(array.array('f', [0.5, -1.5] * 10), 'f')
+    check_decode(array.array('d', [0.1, -1e300] * 10), 'd')
+    check_decode([0.5] * 100, 'd')
+
+def test_bulk_decode_mixed():
+    check_decode([1.5] * 20 + [1])
+    check_decode(range(20) + [128])
+    check_decode([1 << 40] * 10 + [-(1 << 40)] * 10)
+
+def test_bulk_decode_hooks():
+    packed = packs({"v": [1.5] * 20})
+    assert_equal(unpacks(packed, list_hook=len), {"v": 20})
+    assert_equal(unpacks(packed, list_hook=len, use_array=True), {"v": 20})
+
+def test_bulk_decode_stream():
+    packed = packs([0.5] * 20)
+    unpacker = Unpacker(use_array=True)
+    unpacker.feed(packed[:-1])
+    assert_raises(StopIteration, unpacker.unpack)
+    unpacker.feed(packed[-1:])
+    assert_equal(unpacker.unpack(), array.array('d', [0.5] * 20))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from nose import main
+from nose.tools import *
+
+import mmap
+import tempfile
+from msgpack_pure import packs, unpacks, unpack_from, extract, Unpacker
+
+objs = [1, "foo", (1.5, None), {"bar": ("baz", 1 << 40)}, "x" * 100]
+packed = "".join(packs(o) for o in objs)
+
+def check_back_to_back(buf):
+    unpacker = Unpacker()
+    offset = 0
+    for o in objs:
+        obj, offset = unpacker.unpack_from(buf, offset)
+        assert_equal(obj, o)
+    assert_equal(offset, len(packed))
+
+def test_str():
+    check_back_to_back(packed)
+
+def test_bytearray():
+    check_back_to_back(bytearray(packed))
+
+def test_memoryview():
+    check_back_to_back(memoryview(packed))
+
+def test_buffer():
+    check_back_to_back(buffer(packed))
+
+def test_mmap():
+    f = tempfile.TemporaryFile()
+    f.write(packed)
+    f.flush()
+    m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        check_back_to_back(m)
+    finally:
+        m.close()
+        f.close()
+
+def test_raw_type():
+    obj, offset = unpack_from(bytearray(packs(("foo", "x" * 40))))
+    assert_equal(map(type, obj), [str, str])
+
+def test_offset():
+    assert_equal(unpack_from("\xc0" + packs("foo"), 1), ("foo", 5))
+
+def test_incomplete():
+    assert_raises(ValueError, unpacks, packs("foobar")[:-1])
+    assert_raises(ValueError, unpack_from, packs((1, 2, 3))[:-1])
+
+def test_raw_view():
+    data = bytearray(packs(("foo", "x" * 40, "y" * 70000)))
+    obj, offset = unpack_from(data, raw_view_threshold=32)
+    assert_equal(type(obj[0]), str)
+    assert_equal(map(type, obj[1:]), [memoryview, memoryview])
+    assert_equal(obj[1].tobytes(), "x" * 40)
+    assert_equal(obj[2].tobytes(), "y" * 70000)
+
+    # the views share memory with the input
+    data[-1] = "z"
+    assert_equal(obj[2].tobytes(), "y" * 69999 + "z")
+
+def test_raw_view_keys():
+    # map keys stay hashable
+    key = "k" * 40
+    packed = packs({key: "v" * 40, "a": {key: 1}})
+    obj = unpacks(packed, raw_view_threshold=0)
+    assert_equal(sorted(obj), ["a", key])
+    assert_equal(obj[key].tobytes(), "v" * 40)
+    assert_equal(obj["a"], {key: 1})
+    assert_equal(unpacks(packed, raw_view_threshold=0, lazy=True)["a"][key], 1)
+    assert_equal(extract(packed, ("a", key), raw_view_threshold=0), 1)
+
+def test_raw_view_stream():
+    unpacker = Unpacker(raw_view_threshold=0)
+    unpacker.feed(packs("foo")[:2])
+    assert_raises(StopIteration, unpacker.unpack)
+    unpacker.feed(packs("foo")[2:] + packs(""))
+    assert_equal(unpacker.unpack().tobytes(), "foo")
+    assert_equal(unpacker.unpack().tobytes(), "")
+
+if __name__ == '__main__':
+    main()